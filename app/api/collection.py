@@ -4,14 +4,16 @@ from fastapi import Depends
 from sqlalchemy.ext.asyncio import AsyncSession
 from uuid import UUID as Uuid
 
+from core.config import COLLECTION_STATS_BACKGROUND
+from infra.cache import stats_cache
 from infra.database import get_db
 from auth.auth import get_current_user
 from infra.models import *
 from logic.collection import delete_doc_from_collection
-from schema.collection import Collect, CollectContent, WordStat, CollectionStat, CollectCreate
-from logic.document import get_doc_by_id
-from logic.collection import create_coll, get_coll, get_colls, get_collection_stat, add_doc_to_collection, delete_doc_from_collection, delete_coll
-from exceptions import document_404, collection_404, access_denied_403
+from schema.collection import Collect, CollectContent, CollectDocuments, CollectionSearch, SearchHit, SimilarDocuments, WordStat, CollectionStat, CollectCreate
+from logic.document import get_doc_author, get_docs_authors
+from logic.collection import create_coll, get_coll_author, get_coll_pending, get_coll_documents, get_colls, get_collection_stat, add_doc_to_collection, add_docs_to_collection, delete_doc_from_collection, delete_docs_from_collection, delete_coll, get_similar_docs, search_collection
+from exceptions import document_404, collection_404, access_denied_403, invalid_cursor_400
 from schema.document import Doc
 
 router = APIRouter(
@@ -54,7 +56,7 @@ async def get_collection(
     ):
     '''Вывод содержимого указанной коллекции текущего пользователя'''
     
-    collection = await get_coll(db, collection_id)
+    collection = await get_coll_documents(db, collection_id)
     if not collection:
         raise collection_404
     if collection.author_id != user.id:
@@ -80,15 +82,77 @@ async def delete_collection(
     ):
     '''Удаление указанной коллекции текущего пользователя'''
     
-    collection = await get_coll(db, collection_id)
-    if not collection:
+    author_id = await get_coll_author(db, collection_id)
+    if not author_id:
         raise collection_404
-    if collection.author_id != user.id:
+    if author_id != user.id:
         raise access_denied_403
     
     await delete_coll(db, collection_id)
     return {'status': 'deleted'}
 
+async def check_bulk_access(db: AsyncSession, collection_id: Uuid, doc_ids: list[Uuid], user: User) -> list[Uuid]:
+    '''Проверка владельца коллекции и всех документов двумя запросами. Возвращает id без повторов'''
+    author_id = await get_coll_author(db, collection_id)
+    if not author_id:
+        raise collection_404
+    if author_id != user.id:
+        raise access_denied_403
+    
+    doc_ids = list(dict.fromkeys(doc_ids))
+    doc_authors = await get_docs_authors(db, doc_ids)
+    if len(doc_authors) != len(doc_ids):
+        raise document_404
+    if any(doc_author_id != user.id for doc_author_id in doc_authors.values()):
+        raise access_denied_403
+    return doc_ids
+
+@router.post('/{collection_id}/documents', response_model=CollectContent)
+async def add_documents_to_collection(
+    collection_id: Annotated[Uuid, Path(..., description='Collection ID')],
+    body: CollectDocuments,
+    user: User = Depends(get_current_user),
+    db: AsyncSession = Depends(get_db)
+    ):
+    '''Добавление списка документов в указанную коллекцию текущего пользователя одним обновлением статистики'''
+    
+    doc_ids = await check_bulk_access(db, collection_id, body.doc_ids, user)
+    collection = await add_docs_to_collection(db, collection_id, doc_ids)
+    return CollectContent(
+        id=collection_id,
+        name=collection.name,
+        documents=[
+            Doc(
+                id=doc.id,
+                doc_name=doc.name
+            )
+            for doc in collection.documents
+            ]
+        )
+
+@router.delete('/{collection_id}/documents', response_model=CollectContent)
+async def delete_documents_from_collection(
+    collection_id: Annotated[Uuid, Path(..., description='Collection ID')],
+    body: CollectDocuments,
+    user: User = Depends(get_current_user),
+    db: AsyncSession = Depends(get_db)
+    ):
+    '''Удаление списка документов из указанной коллекции текущего пользователя одним обновлением статистики'''
+    
+    doc_ids = await check_bulk_access(db, collection_id, body.doc_ids, user)
+    collection = await delete_docs_from_collection(db, collection_id, doc_ids)
+    return CollectContent(
+        id=collection_id,
+        name=collection.name,
+        documents=[
+            Doc(
+                id=doc.id,
+                doc_name=doc.name
+            )
+            for doc in collection.documents
+            ]
+        )
+
 @router.post('/{collection_id}/{doc_id}', response_model=CollectContent)
 async def add_document_to_collection(
     collection_id: Annotated[Uuid, Path(..., description='Collection ID')],
@@ -98,16 +162,16 @@ async def add_document_to_collection(
     ):
     '''Добавление указанного документа в указанную коллекцию текущего пользователя'''
     
-    collection = await get_coll(db, collection_id)
-    if not collection:
+    author_id = await get_coll_author(db, collection_id)
+    if not author_id:
         raise collection_404
-    if collection.author_id != user.id:
+    if author_id != user.id:
         raise access_denied_403
     
-    document = await get_doc_by_id(db, doc_id)
-    if not document:
+    doc_author_id = await get_doc_author(db, doc_id)
+    if not doc_author_id:
         raise document_404
-    if document.author_id != user.id:
+    if doc_author_id != user.id:
         raise access_denied_403
     
     collection = await add_doc_to_collection(db, collection_id, doc_id)
@@ -132,16 +196,16 @@ async def delete_document_from_collection(
     ):
     '''Удаление указанного документа из указанной коллекции текущего пользователя'''
     
-    collection = await get_coll(db, collection_id)
-    if not collection:
+    author_id = await get_coll_author(db, collection_id)
+    if not author_id:
         raise collection_404
-    if collection.author_id != user.id:
+    if author_id != user.id:
         raise access_denied_403
     
-    document = await get_doc_by_id(db, doc_id)
-    if not document:
+    doc_author_id = await get_doc_author(db, doc_id)
+    if not doc_author_id:
         raise document_404
-    if document.author_id != user.id:
+    if doc_author_id != user.id:
         raise access_denied_403
     
     collection = await delete_doc_from_collection(db, collection_id, doc_id)
@@ -162,28 +226,123 @@ async def get_statistic(
     collection_id: Annotated[Uuid, Path(..., description='Collection ID')],
     offset: int = Query(0, ge=0, description='Offset from the beginning'),
     limit: int = Query(50, ge=1, description='Number of items to return'),
+    after_tf: float | None = Query(None, description='Cursor: tf of the last item of the previous page'),
+    after_word: str | None = Query(None, description='Cursor: word of the last item of the previous page'),
     user: User = Depends(get_current_user),
     db: AsyncSession = Depends(get_db)
     ):
     '''Вывод статистики по указанной коллекции текущего пользователя:
     первые limit слов, их частота (tf) и обратная частота (idf) с начальным смещением offset,
-    упорядоченные по убыванию tf'''
+    упорядоченные по убыванию tf.\n
+    Для постраничного вывода без offset в следующий запрос передаются next_after_tf и next_after_word из ответа'''
     
-    collection = await get_coll(db, collection_id)
-    if not collection:
+    if (after_tf is None) != (after_word is None):
+        raise invalid_cursor_400
+    
+    author_id = await get_coll_author(db, collection_id)
+    if not author_id:
         raise collection_404
-    if collection.author_id != user.id:
+    if author_id != user.id:
         raise access_denied_403
     
-    stats = await get_collection_stat(db, collection_id, offset, limit)
-    return CollectionStat(
-        id=collection_id,
-        stats=[
-            WordStat(
-                word=stat.word,
-                tf=stat.tf,
-                idf=stat.idf
+    async def build() -> CollectionStat:
+        stats = await get_collection_stat(db, collection_id, offset, limit, after_tf, after_word)
+        last = stats[-1] if len(stats) == limit else None
+        pending = await get_coll_pending(db, collection_id) if COLLECTION_STATS_BACKGROUND else 0
+        return CollectionStat(
+            id=collection_id,
+            stats=[
+                WordStat(
+                    word=stat.word,
+                    tf=stat.tf,
+                    idf=stat.idf
+                )
+                for stat in stats
+            ],
+            next_after_tf=last.tf if last else None,
+            next_after_word=last.word if last else None,
+            stale=pending > 0,
+            pending_documents=pending
+        )
+    
+    return await stats_cache.get_or_build(
+        'collection',
+        collection_id,
+        (offset, limit, after_tf, after_word),
+        CollectionStat,
+        build
+    )
+
+@router.get('/{collection_id}/search', response_model=CollectionSearch)
+async def search(
+    collection_id: Annotated[Uuid, Path(..., description='Collection ID')],
+    q: str = Query(..., min_length=1, description='Search query'),
+    limit: int = Query(10, ge=1, description='Number of documents to return'),
+    user: User = Depends(get_current_user),
+    db: AsyncSession = Depends(get_db)
+    ):
+    '''Поиск по документам указанной коллекции текущего пользователя:
+    limit документов, упорядоченных по убыванию суммы tf * idf слов запроса q'''
+    
+    author_id = await get_coll_author(db, collection_id)
+    if not author_id:
+        raise collection_404
+    if author_id != user.id:
+        raise access_denied_403
+    
+    async def build() -> CollectionSearch:
+        results = await search_collection(db, collection_id, q, limit)
+        return CollectionSearch(
+            id=collection_id,
+            query=q,
+            results=[
+                SearchHit(
+                    id=doc.id,
+                    doc_name=doc.name,
+                    score=score
+                )
+                for doc, score in results
+            ]
+        )
+    
+    return await stats_cache.get_or_build(
+        'collection',
+        collection_id,
+        ('search', limit, q),
+        CollectionSearch,
+        build
+    )
+
+@router.get('/{collection_id}/documents/{doc_id}/similar', response_model=SimilarDocuments)
+async def get_similar(
+    collection_id: Annotated[Uuid, Path(..., description='Collection ID')],
+    doc_id: Annotated[Uuid, Path(..., description='Document ID')],
+    limit: int = Query(10, ge=1, description='Number of documents to return'),
+    user: User = Depends(get_current_user),
+    db: AsyncSession = Depends(get_db)
+    ):
+    '''Вывод limit документов указанной коллекции текущего пользователя, наиболее похожих на документ doc_id
+    (косинус векторов tf * idf), упорядоченных по убыванию сходства'''
+    
+    author_id = await get_coll_author(db, collection_id)
+    if not author_id:
+        raise collection_404
+    if author_id != user.id:
+        raise access_denied_403
+    
+    results = await get_similar_docs(db, collection_id, doc_id, limit)
+    if results is None:
+        raise document_404
+    
+    return SimilarDocuments(
+        id=doc_id,
+        collection_id=collection_id,
+        results=[
+            SearchHit(
+                id=doc.id,
+                doc_name=doc.name,
+                score=score
             )
-            for stat in stats
+            for doc, score in results
         ]
-    )
\ No newline at end of file
+    )
@@ -1,17 +1,26 @@
-from typing import Annotated
+from base64 import b64encode
+import json
+import time
+from typing import Annotated, Iterator, Literal
 from fastapi import APIRouter, HTTPException, Path, File, Query, UploadFile
 from fastapi import Depends
+from fastapi.responses import StreamingResponse
 from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import load_only
 from uuid import UUID as Uuid
 
 from schema.huffman import Huffman
+from logic.huffman import iter_bits
+from infra.cache import stats_cache
 from infra.database import get_db
 from auth.auth import get_current_user
-from infra.models import User
-from logic.collection import delete_doc_from_collection
-from schema.document import Doc, DocContent, DocStat, WordDocStat
-from logic.document import create_doc, delete_doc, get_doc_by_id, get_doc_stat, get_docs_by_user
-from exceptions import document_404, access_denied_403
+from infra.models import Document, User
+from logic.collection import get_coll_author
+from schema.document import BatchFileResult, BatchUpload, Doc, DocContent, DocStat, WordDocStat
+from logic.analysis import analyze_upload
+from logic.batch import analyze_batch
+from logic.document import create_doc, create_docs, delete_doc, get_doc_author, get_doc_by_id, get_doc_stat, get_docs_by_user
+from exceptions import collection_404, document_404, access_denied_403, invalid_cursor_400
 
 router = APIRouter(
     prefix='/api/documents',
@@ -32,18 +41,52 @@ async def create_document(
     if not file.filename.endswith('.txt'):
         raise HTTPException(status_code=400, detail='Invalid file extension. Valid only *.txt')
     
-    text_bytes = await file.read()
-    if not text_bytes:
+    start_time = time.monotonic()
+    text, analysis = await analyze_upload(file)
+    if not text:
         raise HTTPException(status_code=400, detail='File is empty')
-
-    text = text_bytes.decode('utf-8')
     
-    doc = await create_doc(db, user.id, file.filename.removesuffix('.txt'), text)
+    doc = await create_doc(db, user.id, file.filename.removesuffix('.txt'), text, analysis, start_time)
     return Doc(
         id=doc.id,
         doc_name=doc.name
     )
 
+@router.post('/batch', response_model=BatchUpload)
+async def create_documents_batch(
+    files: list[UploadFile] = File(..., description='*.txt файлы или *.zip архивы с *.txt файлами'),
+    collection_id: Uuid | None = Query(None, description='Коллекция, в которую добавляются загруженные документы'),
+    user: User = Depends(get_current_user),
+    db: AsyncSession = Depends(get_db)
+    ):
+    '''Пакетная загрузка документов текущему пользователю одним запросом и одной транзакцией.
+    Результат возвращается по каждому файлу: id документа или описание ошибки'''
+    
+    if collection_id is not None:
+        author_id = await get_coll_author(db, collection_id)
+        if not author_id:
+            raise collection_404
+        if author_id != user.id:
+            raise access_denied_403
+    
+    batch = await analyze_batch(files)
+    processed = [file for file in batch if file.error is None]
+    docs = iter(await create_docs(db, user.id, processed, collection_id) if processed else [])
+    
+    results = []
+    for file in batch:
+        if file.error is None:
+            doc = next(docs)
+            results.append(BatchFileResult(filename=file.filename, id=doc.id, doc_name=doc.name))
+        else:
+            results.append(BatchFileResult(filename=file.filename, error=file.error))
+    return BatchUpload(
+        created=len(processed),
+        failed=len(batch) - len(processed),
+        collection_id=collection_id,
+        results=results
+    )
+
 @router.get('/', response_model=list[Doc])
 async def get_documents(user: User = Depends(get_current_user), db: AsyncSession = Depends(get_db)):
     '''Вывод списка всех документов текущего пользователя'''
@@ -65,7 +108,7 @@ async def get_document(
     ):
     '''Вывод содержимого указанного документа текущего пользователя'''
     
-    doc = await get_doc_by_id(db, doc_id)
+    doc = await get_doc_by_id(db, doc_id, load_only(Document.name, Document.text, Document.author_id))
     if not doc:
         raise document_404
     if doc.author_id != user.id:
@@ -81,14 +124,12 @@ async def delete_document(
     ):
     '''Удаление указанного документа текущего пользователя'''
     
-    doc = await get_doc_by_id(db, doc_id)
-    if not doc:
+    author_id = await get_doc_author(db, doc_id)
+    if not author_id:
         raise document_404
-    if doc.author_id != user.id:
+    if author_id != user.id:
         raise access_denied_403
     
-    for collection in doc.collections:
-        await delete_doc_from_collection(db, collection.id, doc.id)
     await delete_doc(db, doc_id)
     return {'status': 'deleted'}
         
@@ -97,45 +138,82 @@ async def get_statistic(
     doc_id: Annotated[Uuid, Path(..., description='Document ID')],
     offset: int = Query(0, ge=0, description='Offset from the beginning'),
     limit: int = Query(50, ge=1, description='Number of items to return'),
+    after_tf: float | None = Query(None, description='Cursor: tf of the last item of the previous page'),
+    after_word: str | None = Query(None, description='Cursor: word of the last item of the previous page'),
     user: User = Depends(get_current_user),
     db: AsyncSession = Depends(get_db)
     ):
     '''Вывод статистики по указанному документу текущего пользователя:
     первые limit слов и их частота (tf) с начальным смещением offset,
-    упорядоченные по убыванию частоты'''
+    упорядоченные по убыванию частоты.\n
+    Для постраничного вывода без offset в следующий запрос передаются next_after_tf и next_after_word из ответа'''
     
-    doc = await get_doc_by_id(db, doc_id)
-    if not doc:
+    if (after_tf is None) != (after_word is None):
+        raise invalid_cursor_400
+    
+    author_id = await get_doc_author(db, doc_id)
+    if not author_id:
         raise document_404
-    if doc.author_id != user.id:
+    if author_id != user.id:
         raise access_denied_403
     
-    stats = await get_doc_stat(db, doc_id, offset, limit)
-    return DocStat(
-        id=doc_id,
-        stats=[
-            WordDocStat(
-                word=stat.word,
-                tf=stat.tf
-            )
-            for stat in stats
-        ]
-    )
+    async def build() -> DocStat:
+        stats = await get_doc_stat(db, doc_id, offset, limit, after_tf, after_word)
+        last = stats[-1] if len(stats) == limit else None
+        return DocStat(
+            id=doc_id,
+            stats=[
+                WordDocStat(
+                    word=stat.word,
+                    tf=stat.tf
+                )
+                for stat in stats
+            ],
+            next_after_tf=last.tf if last else None,
+            next_after_word=last.word if last else None
+        )
+    
+    return await stats_cache.get_or_build('doc', doc_id, (offset, limit, after_tf, after_word), DocStat, build)
+    
+def stream_huffman_bits(doc: Document) -> Iterator[str]:
+    '''JSON ответа Huffman, в котором encoded_content выдается частями iter_bits. Строка из 0/1
+    не требует экранирования, поэтому части пишутся в ответ как есть'''
+    yield '{"encoded_content":"'
+    yield from iter_bits(doc.huffman, doc.huffman_bit_length)
+    rest = {'encoding': 'bits', 'bit_length': doc.huffman_bit_length, 'codebook': doc.huffman_codebook}
+    yield '",' + json.dumps(rest, ensure_ascii=False, separators=(',', ':'))[1:]
     
 @router.get('/{doc_id}/huffman', response_model=Huffman)
 async def get_huffman(
     doc_id: Annotated[Uuid, Path(..., description='Document ID')],
+    format: Literal['bits', 'base64'] = Query('bits', description='bits - text of 0/1, base64 - packed bits'),
     user: User = Depends(get_current_user),
     db: AsyncSession = Depends(get_db)
     ):
-    '''Представление содержимого документа в виде кода Хаффма.\n
-    Оценка алгоритма. Сложность по памяти: O(L). Сложность по времени: O(L + n log(n)).\n
+    '''Представление содержимого документа в виде кода Хаффмана.\n
+    Код хранится в упакованном виде вместе с каноническим словарем (символ -> длина кода) и длиной в битах.
+    По умолчанию возвращается текстовое представление из 0/1: оно строится лениво и отдается потоком,
+    при format=base64 возвращаются упакованные биты.\n
+    Оценка алгоритма. Сложность по памяти: O(L) для упакованного кода, текст из 0/1 строится частями.
+    Сложность по времени: O(L + n log(n)).\n
     L - длина исходного текста, n - мощность алфавита.'''
     
-    doc = await get_doc_by_id(db, doc_id)
+    doc = await get_doc_by_id(
+        db,
+        doc_id,
+        load_only(Document.huffman, Document.huffman_codebook, Document.huffman_bit_length, Document.author_id)
+        )
     if not doc:
         raise document_404
     if doc.author_id != user.id:
         raise access_denied_403
     
-    return Huffman(encoded_content=doc.huffman)
\ No newline at end of file
+    if format == 'bits':
+        return StreamingResponse(stream_huffman_bits(doc), media_type='application/json')
+    
+    return Huffman(
+        encoded_content=b64encode(doc.huffman).decode('ascii'),
+        encoding=format,
+        bit_length=doc.huffman_bit_length,
+        codebook=doc.huffman_codebook
+    )
\ No newline at end of file
@@ -1,11 +1,16 @@
 from fastapi import APIRouter, Depends
+from fastapi.responses import PlainTextResponse
 
 from sqlalchemy import select, func
 from sqlalchemy.ext.asyncio import AsyncSession
 
-from schema.info import Metrics, Status, Version
-from infra.database import get_db
-from infra.models import User, Document
+from schema.info import CacheStats, DatabasePoolStats, Metrics, PasswordHashStats, Status, Version
+from infra.cache import stats_cache
+from infra.database import engine, get_db, pool_checkout_time
+from infra.executor import password_pool
+from infra.models import Document
+from logic.metrics import get_counters, get_process_time_sketch
+from core.metrics import render_prometheus
 from core.version import version
 
 router = APIRouter(
@@ -25,35 +30,81 @@ async def get_version():
 
 @router.get('/metrics', response_model=Metrics)
 async def get_metrics(db: AsyncSession = Depends(get_db)):
-    '''Число обработанных файлов, min/max/avg время обработки,
+    '''Число обработанных файлов, min/max/avg и p50/p95/p99 время обработки,
     timestamp загрузки последнего файла, средняя число слов на файл,
-    среднее число файлов на пользователя'''
-    doc_metrics = await db.execute(
+    среднее число файлов на пользователя.
+
+    Счетчики читаются из строки агрегатов, min/max - с края индексов, квантили - из корзин скетча,
+    поэтому время ответа не зависит от числа документов'''
+    counters = await get_counters(db)
+    doc_count = counters.docs if counters else 0
+    user_count = counters.users if counters else 0
+    time_count = counters.process_time_count if counters else 0
+    
+    extremes = await db.execute(
         select(
-            func.count(Document.id),
             func.min(Document.process_time),
             func.max(Document.process_time),
-            func.avg(Document.process_time),
-            func.max(Document.created_at),
-            func.avg(Document.length)
+            func.max(Document.created_at)
         )
     )
-    doc_count, min_time, max_time, avg_time, last_created_time, avg_doc_length = doc_metrics.one()
-    
-    user_metrics = await db.execute(
-        select(
-            func.count(User.id)
-        )
-    )
-    
-    user_count = user_metrics.scalar_one()
+    min_time, max_time, last_created_time = extremes.one()
+    sketch = await get_process_time_sketch(db)
     
     return Metrics(
         files_processed=doc_count,
         min_time_processed=min_time if min_time else 0.0,
         max_time_processed=max_time if max_time else 0.0,
-        avg_time_processed=avg_time if avg_time else 0.0,
+        avg_time_processed=counters.process_time_sum / time_count if time_count > 0 else 0.0,
+        p50_time_processed=sketch.quantile(0.5),
+        p95_time_processed=sketch.quantile(0.95),
+        p99_time_processed=sketch.quantile(0.99),
         latest_file_processed_timestamp=last_created_time.timestamp() if last_created_time else 0.0,
-        avg_words_per_file=int(avg_doc_length) if avg_doc_length else 0,
+        avg_words_per_file=counters.total_words // doc_count if doc_count > 0 else 0,
         avg_files_per_user=doc_count // user_count if user_count > 0 else 0
+    )
+
+@router.get('/metrics/prometheus', response_class=PlainTextResponse)
+async def get_prometheus_metrics():
+    '''Метрики текущего процесса в текстовом формате Prometheus: счетчики кэшей, время ожидания пулов
+    и гистограммы этапов обработки документов (при INSTRUMENTATION_ENABLED=true)'''
+    return PlainTextResponse(render_prometheus(), media_type='text/plain; version=0.0.4')
+
+@router.get('/cache', response_model=CacheStats)
+async def get_cache_stats():
+    '''Попадания и промахи кэша страниц статистики в текущем процессе'''
+    local_hits = stats_cache.local_hits.value
+    redis_hits = stats_cache.redis_hits.value
+    misses = stats_cache.misses.value
+    total = local_hits + redis_hits + misses
+    return CacheStats(
+        local_hits=local_hits,
+        redis_hits=redis_hits,
+        misses=misses,
+        hit_ratio=(local_hits + redis_hits) / total if total else 0.0
+    )
+
+@router.get('/password-hashing', response_model=PasswordHashStats)
+async def get_password_hash_stats():
+    '''Загрузка пула bcrypt в текущем процессе: время ожидания свободного потока'''
+    queue_time = password_pool.queue_time
+    return PasswordHashStats(
+        workers=password_pool.workers,
+        in_progress=password_pool.in_progress,
+        operations=queue_time.count,
+        avg_queue_ms=queue_time.avg * 1000,
+        max_queue_ms=queue_time.max * 1000
+    )
+
+@router.get('/db-pool', response_model=DatabasePoolStats)
+async def get_db_pool_stats():
+    '''Состояние пула соединений с БД в текущем процессе и время ожидания соединения'''
+    pool = engine.pool
+    return DatabasePoolStats(
+        size=pool.size(),
+        checked_out=pool.checkedout(),
+        overflow=max(pool.overflow(), 0),
+        checkouts=pool_checkout_time.count,
+        avg_checkout_ms=pool_checkout_time.avg * 1000,
+        max_checkout_ms=pool_checkout_time.max * 1000
     )
\ No newline at end of file
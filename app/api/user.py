@@ -5,8 +5,10 @@ from sqlalchemy.ext.asyncio import AsyncSession
 
 from auth.auth import check_password, create_access_token, hash_password, get_current_user, oauth2_scheme
 from auth.blacklist import add_blacklist_token
+from auth.cache import auth_cache
 from infra.database import get_db
 from infra.models import User
+from logic.metrics import record_user_deleted, record_users
 from schema.token import TokenResponse
 from schema.user import ChangePassword, UserOut, UserSchema
 
@@ -29,9 +31,10 @@ async def register(
 
     user = User(
         username=user_form.username,
-        password=hash_password(user_form.password)
+        password=await hash_password(user_form.password)
     )
     db.add(user)
+    await record_users(db)
     await db.commit()
     await db.refresh(user)
     return UserOut(username=user_form.username)
@@ -45,7 +48,7 @@ async def login(
     
     result = await db.execute(select(User).where(User.username == form_data.username))
     user = result.scalar_one_or_none()
-    if not user or not check_password(form_data.password, user.password):
+    if not user or not await check_password(form_data.password, user.password):
         raise HTTPException(status_code=400, detail='Incorrect login or password')
 
     access_token = create_access_token(subject=user.username)
@@ -72,12 +75,13 @@ async def change_password(
     ):
     '''Смена пароля текущего пользователя'''
     
-    if not check_password(password_body.old_password, user.password):
+    if not await check_password(password_body.old_password, user.password):
         raise HTTPException(status_code=403, detail='Wrong old password')
 
-    user.password = hash_password(password_body.new_password)
+    user.password = await hash_password(password_body.new_password)
     db.add(user)
     await db.commit()
+    await auth_cache.invalidate_user(user.username)
     return {'status': 'Password changed successfully'}
 
 @router.delete('/', status_code=204)
@@ -90,8 +94,11 @@ async def delete_user(
     
     result = await add_blacklist_token(token)
     if result:
+        username = current_user.username
+        await record_user_deleted(db, current_user.id)
         await db.delete(current_user)
         await db.commit()
+        await auth_cache.invalidate_user(username)
         return
     else:
         raise HTTPException(status_code=400, detail='Deletion failed')
\ No newline at end of file
@@ -2,31 +2,36 @@ from fastapi import Depends
 from fastapi.security import OAuth2PasswordBearer
 from passlib.context import CryptContext
 from jose import jwt
+import asyncio
 from datetime import timedelta, timezone, datetime
 from typing import Optional
+from uuid import uuid4
 
-from sqlalchemy import select
+from sqlalchemy import inspect, select
+from sqlalchemy.orm import make_transient_to_detached
 from sqlalchemy.ext.asyncio import AsyncSession
 
-from auth.blacklist import is_blacklisted_token
+from auth.blacklist import blacklist_filter, get_token_id, is_blacklisted_token
+from auth.cache import auth_cache
 from infra.models import User 
 from infra.database import get_db
+from infra.executor import password_pool
 from exceptions import credentials_exception
 from core.config import SECRET_KEY, ALGORITHM
 
 pwd_context = CryptContext(schemes=['bcrypt'], deprecated='auto')
 ACCESS_TOKEN_EXPIRE_MINUTES = 30
 
-def hash_password(password: str) -> str:
-    return pwd_context.hash(password)
+async def hash_password(password: str) -> str:
+    return await password_pool.run(pwd_context.hash, password)
 
-def check_password(password: str, hash: str) -> bool:
-    return pwd_context.verify(password, hash)
+async def check_password(password: str, hash: str) -> bool:
+    return await password_pool.run(pwd_context.verify, password, hash)
 
 def create_token(data: dict, expires_delta: Optional[timedelta] = None) -> str:
     to_encode = data.copy()
     expire = datetime.now(timezone.utc) + (expires_delta or timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES))
-    to_encode.update({'exp': expire})
+    to_encode.update({'exp': expire, 'jti': uuid4().hex})
     encoded_jwt = jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
     return encoded_jwt
 
@@ -35,23 +40,54 @@ def create_access_token(subject: str) -> str:
     
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl='/api/auth/login') 
 
+def get_user_snapshot(user: User) -> dict:
+    return {attr.key: getattr(user, attr.key) for attr in inspect(User).column_attrs}
+
+async def get_user_by_username(db: AsyncSession, username: str) -> User | None:
+    '''Пользователь из кэша процесса без запроса к БД (объект присоединяется к сессии через merge(load=False))
+    либо из БД с сохранением в кэш'''
+    snapshot = auth_cache.get_user(username)
+    if snapshot is not None:
+        user = User(**snapshot)
+        make_transient_to_detached(user)
+        return await db.merge(user, load=False)
+
+    result = await db.execute(select(User).where(User.username == username))
+    user = result.scalar_one_or_none()
+    if user is not None:
+        auth_cache.set_user(username, get_user_snapshot(user))
+    return user
+
 async def get_current_user(
     token: str = Depends(oauth2_scheme),
     db: AsyncSession = Depends(get_db)
     ) -> User:
-    if await is_blacklisted_token(token):
-        raise credentials_exception
-    
-    try:
-        payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
-        username: str = payload.get('sub')
-        if username is None:
+    cached = auth_cache.get_token(token)
+    # Выход из системы в любом процессе попадает в локальный фильтр черного списка
+    if cached is not None and cached[1] not in blacklist_filter:
+        user = await get_user_by_username(db, cached[0])
+    else:
+        try:
+            payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
+            username: str = payload.get('sub')
+            if username is None:
+                raise credentials_exception
+        except Exception:
             raise credentials_exception
-    except Exception:
-        raise credentials_exception
-    
-    result = await db.execute(select(User).where(User.username == username))
-    user = result.scalar_one_or_none()
+        
+        # Проверка черного списка (если фильтр не отсек токен локально) и запрос пользователя выполняются одновременно
+        blacklisted, user = await asyncio.gather(
+            is_blacklisted_token(token, payload),
+            get_user_by_username(db, username)
+        )
+        if blacklisted:
+            raise credentials_exception
+        auth_cache.set_token(
+            token,
+            username,
+            get_token_id(token, payload),
+            payload.get('exp', 0) - datetime.now(timezone.utc).timestamp()
+        )
     
     if user is None:
         raise credentials_exception
@@ -1,13 +1,126 @@
 from redis import Redis
 import redis.asyncio as redis
+from redis.exceptions import RedisError
 from jose import jwt
 from datetime import timezone, datetime
+from hashlib import sha256
+import asyncio
+import logging
 
-from core.config import SECRET_KEY, ALGORITHM, REDIS_URL
+from core.config import (
+    SECRET_KEY, ALGORITHM, REDIS_URL,
+    BLACKLIST_FILTER_ENABLED, BLACKLIST_FILTER_CAPACITY, BLACKLIST_FILTER_ERROR_RATE, BLACKLIST_FILTER_REBUILD_INTERVAL
+)
+from infra.bloom import BloomFilter
+from infra.pubsub import cancel_task, listen_channel
+
+logger = logging.getLogger(__name__)
 
 redis_client: Redis = redis.from_url(REDIS_URL)
 
 BLACKLIST_PREFIX = 'token:blacklist:'
+INVALIDATION_CHANNEL = 'auth:invalidate'
+
+def get_token_id(token: str, payload: dict) -> str:
+    '''Ключ токена в черном списке: jti, для токенов без jti - sha256 от токена'''
+    return payload.get('jti') or sha256(token.encode()).hexdigest()
+
+class BlacklistFilter:
+    '''Локальный фильтр Блума по ключам черного списка. Если фильтр построен и подписка на канал
+    активна, отсутствие токена в фильтре означает, что токена нет в черном списке, и запрос к Redis не нужен.
+    Фильтр строится по SCAN при каждой подписке и раз в rebuild_interval секунд (так же удаляются
+    истекшие ключи), между перестроениями пополняется из add_blacklist_token и из канала'''
+
+    def __init__(self, capacity: int, error_rate: float, rebuild_interval: int, enabled: bool = True):
+        self.capacity = capacity
+        self.error_rate = error_rate
+        self.rebuild_interval = rebuild_interval
+        self.enabled = enabled
+        self._bloom = BloomFilter(capacity, error_rate)
+        self._built = False
+        self._subscribed = False
+        self._pending: list[str] | None = None
+        self._tasks: list[asyncio.Task] = []
+
+    @property
+    def ready(self) -> bool:
+        return self._built and self._subscribed
+
+    def add(self, token_id: str):
+        self._bloom.add(token_id)
+        if self._pending is not None:
+            self._pending.append(token_id)
+
+    def __contains__(self, token_id: str) -> bool:
+        return token_id in self._bloom
+
+    def excludes(self, token_id: str) -> bool:
+        '''Токена точно нет в черном списке'''
+        return self.ready and token_id not in self._bloom
+
+    async def rebuild(self):
+        self._pending = []
+        try:
+            token_ids = [
+                key[len(BLACKLIST_PREFIX):].decode()
+                async for key in redis_client.scan_iter(match=f'{BLACKLIST_PREFIX}*', count=1000)
+            ]
+            # Добавленные во время SCAN ключи могли не попасть в выборку
+            token_ids += self._pending
+            bloom = BloomFilter(max(self.capacity, 2 * len(token_ids)), self.error_rate)
+            for token_id in token_ids:
+                bloom.add(token_id)
+            self._bloom = bloom
+            self._built = True
+        except RedisError:
+            logger.warning('Blacklist filter: rebuild failed', exc_info=True)
+            self._built = False
+        finally:
+            self._pending = None
+
+    async def _on_subscribe(self):
+        self._subscribed = True
+        await self.rebuild()
+
+    def _on_message(self, message: str):
+        kind, _, token_id = message.partition(':')
+        if kind == 'token':
+            self.add(token_id)
+
+    def _on_disconnect(self):
+        self._subscribed = False
+
+    async def _rebuild_periodically(self):
+        while True:
+            await asyncio.sleep(self.rebuild_interval)
+            if self._subscribed:
+                await self.rebuild()
+
+    def start(self):
+        if self.enabled and not self._tasks:
+            self._tasks = [
+                asyncio.create_task(listen_channel(
+                    redis_client,
+                    INVALIDATION_CHANNEL,
+                    self._on_message,
+                    self._on_subscribe,
+                    self._on_disconnect
+                )),
+                asyncio.create_task(self._rebuild_periodically())
+            ]
+
+    async def stop(self):
+        for task in self._tasks:
+            await cancel_task(task)
+        self._tasks = []
+        self._subscribed = False
+
+blacklist_filter = BlacklistFilter(
+    capacity=BLACKLIST_FILTER_CAPACITY,
+    error_rate=BLACKLIST_FILTER_ERROR_RATE,
+    rebuild_interval=BLACKLIST_FILTER_REBUILD_INTERVAL,
+    enabled=BLACKLIST_FILTER_ENABLED
+)
 
 async def add_blacklist_token(token: str) -> bool:
     try:
@@ -18,13 +131,25 @@ async def add_blacklist_token(token: str) -> bool:
             now = datetime.now(timezone.utc).timestamp()
             ttl = max(int(exp_timestamp - now), 0)
 
-            key = f'{BLACKLIST_PREFIX}{token}'
+            token_id = get_token_id(token, payload)
+            key = f'{BLACKLIST_PREFIX}{token_id}'
             await redis_client.set(key, '1', ex=ttl)
+            blacklist_filter.add(token_id)
+            try:
+                await redis_client.publish(INVALIDATION_CHANNEL, f'token:{token_id}')
+            except RedisError:
+                logger.warning('Blacklist filter: failed to publish %s', token_id, exc_info=True)
             return True
         return False
     except Exception:
         return False
 
-async def is_blacklisted_token(token: str) -> bool:
-    key = f'{BLACKLIST_PREFIX}{token}'
-    return await redis_client.exists(key) == 1
\ No newline at end of file
+async def is_blacklisted_token(token: str, payload: dict) -> bool:
+    token_id = get_token_id(token, payload)
+    keys = [f'{BLACKLIST_PREFIX}{token_id}']
+    if 'jti' not in payload:
+        # Токены, выпущенные до появления jti, хранились в черном списке целиком
+        keys.append(f'{BLACKLIST_PREFIX}{token}')
+    elif blacklist_filter.excludes(token_id):
+        return False
+    return await redis_client.exists(*keys) > 0
@@ -0,0 +1,110 @@
+import asyncio
+import logging
+from collections import OrderedDict
+from time import monotonic
+from typing import Any
+
+from redis import Redis
+from redis.exceptions import RedisError
+
+from auth.blacklist import INVALIDATION_CHANNEL
+from core.config import AUTH_CACHE_ENABLED, AUTH_CACHE_SIZE, AUTH_CACHE_TTL
+from infra.pubsub import cancel_task, listen_channel
+
+logger = logging.getLogger(__name__)
+
+class TTLCache:
+    '''Словарь с ограничением размера и временем жизни записей'''
+
+    def __init__(self, maxsize: int):
+        self.maxsize = maxsize
+        self._data: OrderedDict[str, tuple[float, Any]] = OrderedDict()
+
+    def get(self, key: str) -> Any:
+        item = self._data.get(key)
+        if item is None:
+            return None
+        expires_at, value = item
+        if expires_at <= monotonic():
+            del self._data[key]
+            return None
+        return value
+
+    def set(self, key: str, value: Any, ttl: float):
+        self._data[key] = (monotonic() + ttl, value)
+        self._data.move_to_end(key)
+        while len(self._data) > self.maxsize:
+            self._data.popitem(last=False)
+
+    def pop(self, key: str):
+        self._data.pop(key, None)
+
+    def clear(self):
+        self._data.clear()
+
+class AuthCache:
+    '''Кэш процесса для get_current_user: проверенные токены (токен -> (username, jti)) и строки пользователей.
+    Изменение пользователя рассылается через Redis pub/sub и удаляет записи во всех процессах,
+    выход из системы отсекается локальным фильтром черного списка (auth.blacklist).
+    Если сообщение потеряно, устаревшая запись живет не дольше ttl секунд'''
+
+    def __init__(self, maxsize: int, ttl: float, enabled: bool = True):
+        self.ttl = ttl
+        self.enabled = enabled
+        self.tokens = TTLCache(maxsize)
+        self.users = TTLCache(maxsize)
+        self._client: Redis | None = None
+        self._listener: asyncio.Task | None = None
+
+    def get_token(self, token: str) -> tuple[str, str] | None:
+        return self.tokens.get(token) if self.enabled else None
+
+    def set_token(self, token: str, username: str, token_id: str, expires_in: float):
+        if self.enabled and expires_in > 0:
+            self.tokens.set(token, (username, token_id), min(self.ttl, expires_in))
+
+    def get_user(self, username: str) -> dict | None:
+        return self.users.get(username) if self.enabled else None
+
+    def set_user(self, username: str, snapshot: dict):
+        if self.enabled:
+            self.users.set(username, snapshot, self.ttl)
+
+    def clear(self):
+        self.tokens.clear()
+        self.users.clear()
+
+    async def invalidate_user(self, username: str):
+        self.users.pop(username)
+        if not self.enabled or self._client is None:
+            return
+        try:
+            await self._client.publish(INVALIDATION_CHANNEL, f'user:{username}')
+        except RedisError:
+            logger.warning('Auth cache: failed to publish invalidation', exc_info=True)
+
+    def _on_message(self, message: str):
+        kind, _, username = message.partition(':')
+        if kind == 'user':
+            self.users.pop(username)
+
+    async def _on_subscribe(self):
+        self.clear()
+
+    def start(self, client: Redis):
+        self._client = client
+        if self.enabled and self._listener is None:
+            self._listener = asyncio.create_task(
+                listen_channel(client, INVALIDATION_CHANNEL, self._on_message, self._on_subscribe, self.clear)
+            )
+
+    async def stop(self):
+        await cancel_task(self._listener)
+        self._listener = None
+        self.clear()
+
+auth_cache = AuthCache(
+    maxsize=AUTH_CACHE_SIZE,
+    ttl=AUTH_CACHE_TTL,
+    enabled=AUTH_CACHE_ENABLED
+)
@@ -1,4 +1,4 @@
-from os import getenv
+from os import cpu_count, getenv
 from dotenv import load_dotenv
 
 load_dotenv()
@@ -11,6 +11,14 @@ POSTGRES_PORT = getenv('POSTGRES_PORT')
 
 DATABASE_URL = f'postgresql+asyncpg://{POSTGRES_USER}:{POSTGRES_PASSWORD}@{POSTGRES_HOST}:{POSTGRES_PORT}/{POSTGRES_DB}'
 
+DB_ECHO = getenv('DB_ECHO', 'false').lower() == 'true'
+DB_POOL_SIZE = int(getenv('DB_POOL_SIZE', 10))
+DB_MAX_OVERFLOW = int(getenv('DB_MAX_OVERFLOW', 10))
+DB_POOL_TIMEOUT = float(getenv('DB_POOL_TIMEOUT', 30))
+DB_POOL_RECYCLE = int(getenv('DB_POOL_RECYCLE', 1800))
+DB_POOL_PRE_PING = getenv('DB_POOL_PRE_PING', 'true').lower() == 'true'
+DB_STATEMENT_CACHE_SIZE = int(getenv('DB_STATEMENT_CACHE_SIZE', 100))
+
 SECRET_KEY = getenv('SECRET_KEY')
 ALGORITHM = 'HS256'
 
@@ -18,4 +26,43 @@ REDIS_HOST = getenv('REDIS_HOST')
 REDIS_PORT = getenv('REDIS_PORT')
 REDIS_DB = getenv('REDIS_DB')
 
-REDIS_URL = f'redis://{REDIS_HOST}:{REDIS_PORT}/{REDIS_DB}'
\ No newline at end of file
+REDIS_URL = f'redis://{REDIS_HOST}:{REDIS_PORT}/{REDIS_DB}'
+
+# Число процессов uvicorn (uvicorn читает эту же переменную для --workers)
+WEB_CONCURRENCY = int(getenv('WEB_CONCURRENCY', 1))
+WARMUP_DB_CONNECTIONS = int(getenv('WARMUP_DB_CONNECTIONS', 2))
+
+ANALYSIS_WORKERS = int(getenv('ANALYSIS_WORKERS', max((cpu_count() or 1) // WEB_CONCURRENCY, 1)))
+ANALYSIS_QUEUE_SIZE = int(getenv('ANALYSIS_QUEUE_SIZE', 2 * ANALYSIS_WORKERS))
+ANALYSIS_INLINE_THRESHOLD = int(getenv('ANALYSIS_INLINE_THRESHOLD', 64 * 1024))
+ANALYSIS_RETRY_AFTER = int(getenv('ANALYSIS_RETRY_AFTER', 5))
+
+PASSWORD_HASH_WORKERS = int(getenv('PASSWORD_HASH_WORKERS', min(cpu_count() or 1, 4)))
+
+MAX_UPLOAD_SIZE = int(getenv('MAX_UPLOAD_SIZE', 50 * 1024 * 1024))
+UPLOAD_CHUNK_SIZE = int(getenv('UPLOAD_CHUNK_SIZE', 256 * 1024))
+BATCH_UPLOAD_MAX_FILES = int(getenv('BATCH_UPLOAD_MAX_FILES', 1000))
+BATCH_UPLOAD_MAX_SIZE = int(getenv('BATCH_UPLOAD_MAX_SIZE', 200 * 1024 * 1024))
+COLLECTION_BULK_MAX_DOCS = int(getenv('COLLECTION_BULK_MAX_DOCS', 10000))
+
+COLLECTION_STATS_BACKGROUND = getenv('COLLECTION_STATS_BACKGROUND', 'false').lower() == 'true'
+COLLECTION_STATS_QUEUE = getenv('COLLECTION_STATS_QUEUE', 'memory')
+
+SIMILARITY_INDEX_CACHE_SIZE = int(getenv('SIMILARITY_INDEX_CACHE_SIZE', 8))
+
+DB_QUERY_COUNT_HEADER = getenv('DB_QUERY_COUNT_HEADER', 'false').lower() == 'true'
+
+STATS_CACHE_ENABLED = getenv('STATS_CACHE_ENABLED', 'true').lower() == 'true'
+STATS_CACHE_TTL = int(getenv('STATS_CACHE_TTL', 300))
+STATS_CACHE_LOCAL_SIZE = int(getenv('STATS_CACHE_LOCAL_SIZE', 1024))
+STATS_CACHE_VERSION_TTL = float(getenv('STATS_CACHE_VERSION_TTL', 5))
+
+AUTH_CACHE_ENABLED = getenv('AUTH_CACHE_ENABLED', 'true').lower() == 'true'
+AUTH_CACHE_TTL = int(getenv('AUTH_CACHE_TTL', 30))
+AUTH_CACHE_SIZE = int(getenv('AUTH_CACHE_SIZE', 10000))
+
+BLACKLIST_FILTER_ENABLED = getenv('BLACKLIST_FILTER_ENABLED', 'true').lower() == 'true'
+BLACKLIST_FILTER_CAPACITY = int(getenv('BLACKLIST_FILTER_CAPACITY', 100000))
+BLACKLIST_FILTER_ERROR_RATE = float(getenv('BLACKLIST_FILTER_ERROR_RATE', 0.001))
+BLACKLIST_FILTER_REBUILD_INTERVAL = int(getenv('BLACKLIST_FILTER_REBUILD_INTERVAL', 600))
+INSTRUMENTATION_ENABLED = getenv('INSTRUMENTATION_ENABLED', 'false').lower() == 'true'
@@ -0,0 +1,201 @@
+import math
+from bisect import bisect_left
+from contextlib import nullcontext
+from functools import wraps
+from time import perf_counter
+
+from core.config import INSTRUMENTATION_ENABLED
+
+class Counter:
+    def __init__(self, name: str, description: str):
+        self.name = name
+        self.description = description
+        self.value = 0
+
+    def inc(self, amount: int = 1):
+        self.value += amount
+
+class Summary:
+    def __init__(self, name: str, description: str):
+        self.name = name
+        self.description = description
+        self.count = 0
+        self.sum = 0.0
+        self.max = 0.0
+
+    def observe(self, value: float):
+        self.count += 1
+        self.sum += value
+        self.max = max(self.max, value)
+
+    @property
+    def avg(self) -> float:
+        return self.sum / self.count if self.count else 0.0
+
+# Границы корзин по умолчанию (секунды), как у клиентов Prometheus, с запасом для больших документов
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+class Histogram:
+    '''Гистограмма с фиксированными границами корзин, по отдельной серии на каждое значение метки label'''
+
+    def __init__(self, name: str, description: str, buckets: tuple[float, ...] = DEFAULT_BUCKETS, label: str | None = None):
+        self.name = name
+        self.description = description
+        self.buckets = buckets
+        self.label = label
+        # значение метки -> [число наблюдений по корзинам (последняя - +Inf), сумма, число]
+        self.series: dict[str | None, list] = {}
+
+    def observe(self, value: float, label_value: str | None = None):
+        series = self.series.get(label_value)
+        if series is None:
+            series = self.series[label_value] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+        series[0][bisect_left(self.buckets, value)] += 1
+        series[1] += value
+        series[2] += 1
+
+registry: dict[str, Counter | Summary | Histogram] = {}
+
+def counter(name: str, description: str) -> Counter:
+    '''Счетчик процесса. Повторный вызов с тем же именем возвращает уже созданный счетчик'''
+    if name not in registry:
+        registry[name] = Counter(name, description)
+    return registry[name]
+
+def summary(name: str, description: str) -> Summary:
+    '''Число, сумма и максимум наблюдений (например, времени ожидания) в процессе'''
+    if name not in registry:
+        registry[name] = Summary(name, description)
+    return registry[name]
+
+def histogram(name: str, description: str, buckets: tuple[float, ...] = DEFAULT_BUCKETS, label: str | None = None) -> Histogram:
+    if name not in registry:
+        registry[name] = Histogram(name, description, buckets, label)
+    return registry[name]
+
+def _format_value(value: float) -> str:
+    if value == math.inf:
+        return '+Inf'
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+def render_prometheus() -> str:
+    '''Все метрики процесса в текстовом формате Prometheus (version 0.0.4)'''
+    lines = []
+    for metric in registry.values():
+        lines.append(f'# HELP {metric.name} {metric.description}')
+        if isinstance(metric, Counter):
+            lines.append(f'# TYPE {metric.name} counter')
+            lines.append(f'{metric.name} {metric.value}')
+        elif isinstance(metric, Summary):
+            lines.append(f'# TYPE {metric.name} summary')
+            lines.append(f'{metric.name}_sum {_format_value(metric.sum)}')
+            lines.append(f'{metric.name}_count {metric.count}')
+        else:
+            lines.append(f'# TYPE {metric.name} histogram')
+            for label_value, (bucket_counts, total, count) in metric.series.items():
+                labels = f'{metric.label}="{label_value}",' if metric.label else ''
+                cumulative = 0
+                for bound, bucket_count in zip((*metric.buckets, math.inf), bucket_counts):
+                    cumulative += bucket_count
+                    lines.append(f'{metric.name}_bucket{{{labels}le="{_format_value(bound)}"}} {cumulative}')
+                labels = f'{{{labels.rstrip(",")}}}' if labels else ''
+                lines.append(f'{metric.name}_sum{labels} {_format_value(total)}')
+                lines.append(f'{metric.name}_count{labels} {count}')
+    return '\n'.join(lines) + '\n'
+
+stage_time = histogram(
+    'document_processing_stage_seconds',
+    'Time spent in each stage of document processing',
+    label='stage'
+)
+
+_disabled_stage = nullcontext()
+
+class _Stage:
+    __slots__ = ('name', 'timings', 'started_at')
+
+    def __init__(self, name: str, timings: dict[str, float] | None):
+        self.name = name
+        self.timings = timings
+
+    def __enter__(self):
+        self.started_at = perf_counter()
+
+    def __exit__(self, *exc_info):
+        elapsed = perf_counter() - self.started_at
+        if self.timings is None:
+            stage_time.observe(elapsed, self.name)
+        else:
+            self.timings[self.name] = self.timings.get(self.name, 0.0) + elapsed
+
+def stage(name: str, timings: dict[str, float] | None = None):
+    '''Замер этапа обработки документа: with stage('commit'): ...
+    Без timings время сразу попадает в гистограмму этапов, с timings - накапливается в словаре
+    (в пуле процессов, где гистограммы главного процесса недоступны) и передается в observe_stages.
+    При INSTRUMENTATION_ENABLED=false возвращается общий пустой контекстный менеджер'''
+    if not INSTRUMENTATION_ENABLED:
+        return _disabled_stage
+    return _Stage(name, timings)
+
+def timed_stage(name: str):
+    '''Декоратор корутины для замера этапа. При выключенных замерах функция возвращается как есть'''
+    def decorator(func):
+        if not INSTRUMENTATION_ENABLED:
+            return func
+
+        @wraps(func)
+        async def wrapper(*args, **kwargs):
+            with _Stage(name, None):
+                return await func(*args, **kwargs)
+        return wrapper
+    return decorator
+
+def observe_stages(timings: dict[str, float]):
+    for name, elapsed in timings.items():
+        stage_time.observe(elapsed, name)
+class QuantileSketch:
+    '''Потоковая оценка квантилей по логарифмическим корзинам (DDSketch): значение x попадает
+    в корзину ceil(log_gamma(x)), gamma = (1 + alpha) / (1 - alpha), и квантиль возвращается
+    с относительной ошибкой не больше alpha. Число корзин растет как логарифм диапазона значений,
+    а не как число наблюдений; корзины двух скетчей с одинаковыми параметрами складываются.
+    Значения меньше min_value попадают в отдельную корзину, которая оценивается нулем'''
+
+    def __init__(self, alpha: float = 0.01, min_value: float = 1e-6):
+        self.alpha = alpha
+        self.min_value = min_value
+        self.gamma = (1 + alpha) / (1 - alpha)
+        self.log_gamma = math.log(self.gamma)
+        self.zero_key = self.key(min_value) - 1
+        self.buckets: dict[int, int] = {}
+        self.count = 0
+
+    def empty(self) -> 'QuantileSketch':
+        return QuantileSketch(self.alpha, self.min_value)
+
+    def key(self, value: float) -> int:
+        if value < self.min_value:
+            return self.zero_key
+        return math.ceil(math.log(value) / self.log_gamma)
+
+    def bucket_value(self, key: int) -> float:
+        if key == self.zero_key:
+            return 0.0
+        return 2 * self.gamma ** key / (self.gamma + 1)
+
+    def add(self, value: float):
+        self.add_bucket(self.key(value), 1)
+
+    def add_bucket(self, key: int, count: int):
+        self.buckets[key] = self.buckets.get(key, 0) + count
+        self.count += count
+
+    def quantile(self, q: float) -> float:
+        if self.count <= 0:
+            return 0.0
+        rank = q * (self.count - 1)
+        seen = 0
+        for key in sorted(self.buckets):
+            seen += self.buckets[key]
+            if seen > rank:
+                return self.bucket_value(key)
+        return self.bucket_value(max(self.buckets))
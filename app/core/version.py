@@ -1 +1 @@
-version = '1.2.3'
\ No newline at end of file
+version = '1.3.0'
\ No newline at end of file
@@ -1,5 +1,7 @@
 from fastapi import HTTPException, status
 
+from core.config import ANALYSIS_RETRY_AFTER, BATCH_UPLOAD_MAX_FILES, BATCH_UPLOAD_MAX_SIZE, MAX_UPLOAD_SIZE
+
 credentials_exception = HTTPException(
     status_code=status.HTTP_401_UNAUTHORIZED,
     detail="Could not validate credentials",
@@ -10,4 +12,27 @@ document_404 = HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail='Docu
 
 collection_404 = HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail='Collection not found')
 
-access_denied_403 = HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail='Access denied')
\ No newline at end of file
+access_denied_403 = HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail='Access denied')
+
+server_busy_503 = HTTPException(
+    status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+    detail='Server is busy, try again later',
+    headers={'Retry-After': str(ANALYSIS_RETRY_AFTER)},
+)
+
+file_too_large_413 = HTTPException(
+    status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+    detail=f'File is too large. Maximum size is {MAX_UPLOAD_SIZE} bytes',
+)
+
+batch_too_large_413 = HTTPException(
+    status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+    detail=f'Batch is too large. Maximum is {BATCH_UPLOAD_MAX_FILES} files and {BATCH_UPLOAD_MAX_SIZE} bytes',
+)
+
+invalid_encoding_400 = HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail='File is not a valid UTF-8 text')
+
+invalid_cursor_400 = HTTPException(
+    status_code=status.HTTP_400_BAD_REQUEST,
+    detail='after_tf and after_word must be passed together',
+)
\ No newline at end of file
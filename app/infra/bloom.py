@@ -0,0 +1,28 @@
+from hashlib import blake2b
+from math import ceil, log
+
+class BloomFilter:
+    '''Фильтр Блума: ответ "нет" точный, ответ "да" ложный с вероятностью около error_rate
+    при числе элементов не больше capacity. Позиции битов - двойное хеширование по одному blake2b'''
+
+    def __init__(self, capacity: int, error_rate: float):
+        capacity = max(capacity, 1)
+        self.size = max(ceil(-capacity * log(error_rate) / log(2) ** 2), 8)
+        self.hash_count = max(round(self.size / capacity * log(2)), 1)
+        self.bits = bytearray((self.size + 7) // 8)
+        self.count = 0
+
+    def _positions(self, item: str) -> list[int]:
+        digest = blake2b(item.encode(), digest_size=16).digest()
+        first = int.from_bytes(digest[:8], 'little')
+        step = int.from_bytes(digest[8:], 'little') | 1
+        return [(first + i * step) % self.size for i in range(self.hash_count)]
+
+    def add(self, item: str):
+        for position in self._positions(item):
+            self.bits[position >> 3] |= 1 << (position & 7)
+        self.count += 1
+
+    def __contains__(self, item: str) -> bool:
+        bits = self.bits
+        return all(bits[position >> 3] & (1 << (position & 7)) for position in self._positions(item))
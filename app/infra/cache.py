@@ -0,0 +1,154 @@
+import asyncio
+import logging
+from collections import OrderedDict
+from typing import Awaitable, Callable, TypeVar
+
+from pydantic import BaseModel
+from redis.exceptions import RedisError
+
+from auth.blacklist import redis_client
+from auth.cache import TTLCache
+from core.config import STATS_CACHE_ENABLED, STATS_CACHE_LOCAL_SIZE, STATS_CACHE_TTL, STATS_CACHE_VERSION_TTL
+from core.metrics import counter
+from infra.pubsub import cancel_task, listen_channel
+
+logger = logging.getLogger(__name__)
+
+M = TypeVar('M', bound=BaseModel)
+
+VERSION_PREFIX = 'stats:version:'
+PAGE_PREFIX = 'stats:page:'
+VERSION_CHANNEL = 'stats:invalidate'
+
+class StatisticsCache:
+    '''Двухуровневый кэш страниц статистики: LRU в памяти процесса перед Redis.
+    Ключ содержит версию сущности, поэтому после bump_version старые страницы просто перестают читаться
+    и вытесняются по LRU/TTL. Если Redis недоступен, кэш пропускается.
+    Версии тоже кэшируются в процессе, чтобы попадание в LRU не требовало запроса к Redis: новая версия
+    рассылается через pub/sub, а при потере сообщения другие процессы узнают о ней не позже чем
+    через version_ttl секунд. Без подписки (start не вызван) версия всегда читается из Redis'''
+
+    def __init__(self, local_size: int, ttl: int, version_ttl: float, enabled: bool = True):
+        self.local_size = local_size
+        self.ttl = ttl
+        self.version_ttl = version_ttl
+        self.enabled = enabled
+        self._local: OrderedDict[str, str] = OrderedDict()
+        self._versions = TTLCache(local_size)
+        self._listener: asyncio.Task | None = None
+        self.local_hits = counter('stats_cache_local_hits', 'Statistics pages served from the in-process LRU')
+        self.redis_hits = counter('stats_cache_redis_hits', 'Statistics pages served from Redis')
+        self.misses = counter('stats_cache_misses', 'Statistics pages built from the database')
+
+    def _set_version(self, key: str, version: int):
+        '''Версии только растут: ответ Redis, полученный до сообщения о новой версии, ее не перезаписывает'''
+        if self._listener is None:
+            return
+        current = self._versions.get(key)
+        if current is None or version > current:
+            self._versions.set(key, version, self.version_ttl)
+
+    async def get_version(self, entity: str, entity_id) -> int | None:
+        key = f'{entity}:{entity_id}'
+        version = self._versions.get(key)
+        if version is not None:
+            return version
+        try:
+            version = int(await redis_client.get(f'{VERSION_PREFIX}{key}') or 0)
+        except RedisError:
+            logger.warning('Statistics cache: Redis is unavailable', exc_info=True)
+            return None
+        self._set_version(key, version)
+        return version
+
+    async def bump_version(self, entity: str, entity_id) -> int | None:
+        '''Возвращает новую версию или None, если кэш выключен или Redis недоступен'''
+        if not self.enabled:
+            return None
+        key = f'{entity}:{entity_id}'
+        try:
+            version = await redis_client.incr(f'{VERSION_PREFIX}{key}')
+        except RedisError:
+            logger.warning('Statistics cache: failed to invalidate %s %s', entity, entity_id, exc_info=True)
+            self._versions.pop(key)
+            return None
+        self._set_version(key, version)
+        try:
+            await redis_client.publish(VERSION_CHANNEL, f'{key}:{version}')
+        except RedisError:
+            logger.warning('Statistics cache: failed to publish version of %s %s', entity, entity_id, exc_info=True)
+        return version
+
+    def _on_message(self, message: str):
+        key, _, version = message.rpartition(':')
+        self._set_version(key, int(version))
+
+    async def _on_subscribe(self):
+        self._versions.clear()
+
+    def start(self):
+        if self.enabled and self._listener is None:
+            self._listener = asyncio.create_task(
+                listen_channel(redis_client, VERSION_CHANNEL, self._on_message, self._on_subscribe, self._versions.clear)
+            )
+
+    async def stop(self):
+        await cancel_task(self._listener)
+        self._listener = None
+        self._versions.clear()
+
+    def _get_local(self, key: str) -> str | None:
+        value = self._local.get(key)
+        if value is not None:
+            self._local.move_to_end(key)
+        return value
+
+    def _set_local(self, key: str, value: str):
+        self._local[key] = value
+        self._local.move_to_end(key)
+        while len(self._local) > self.local_size:
+            self._local.popitem(last=False)
+
+    async def get_or_build(
+        self,
+        entity: str,
+        entity_id,
+        params: tuple,
+        model: type[M],
+        build: Callable[[], Awaitable[M]]
+        ) -> M:
+        version = await self.get_version(entity, entity_id) if self.enabled else None
+        if version is None:
+            return await build()
+
+        key = f'{PAGE_PREFIX}{entity}:{entity_id}:v{version}:' + ':'.join(map(str, params))
+        value = self._get_local(key)
+        if value is not None:
+            self.local_hits.inc()
+            return model.model_validate_json(value)
+
+        try:
+            value = await redis_client.get(key)
+        except RedisError:
+            value = None
+        if value is not None:
+            self.redis_hits.inc()
+            self._set_local(key, value.decode() if isinstance(value, bytes) else value)
+            return model.model_validate_json(value)
+
+        self.misses.inc()
+        result = await build()
+        value = result.model_dump_json()
+        self._set_local(key, value)
+        try:
+            await redis_client.set(key, value, ex=self.ttl)
+        except RedisError:
+            pass
+        return result
+
+stats_cache = StatisticsCache(
+    local_size=STATS_CACHE_LOCAL_SIZE,
+    ttl=STATS_CACHE_TTL,
+    version_ttl=STATS_CACHE_VERSION_TTL,
+    enabled=STATS_CACHE_ENABLED
+)
\ No newline at end of file
@@ -1,24 +1,115 @@
+from contextvars import ContextVar
+from time import perf_counter
+from sqlalchemy import event
 from sqlalchemy.ext.asyncio import create_async_engine, AsyncSession
 from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import AsyncAdaptedQueuePool
 from typing import AsyncGenerator
 
-from core.config import DATABASE_URL
+from core.config import (
+    DATABASE_URL, DB_ECHO, DB_POOL_SIZE, DB_MAX_OVERFLOW, DB_POOL_TIMEOUT,
+    DB_POOL_RECYCLE, DB_POOL_PRE_PING, DB_STATEMENT_CACHE_SIZE
+)
+from core.metrics import summary
 from infra.base import Base
 
+pool_checkout_time = summary('db_pool_checkout_seconds', 'Time spent waiting for a database connection from the pool')
+
+class TimedQueuePool(AsyncAdaptedQueuePool):
+    '''Пул соединений, измеряющий ожидание свободного соединения (включая открытие нового соединения)'''
+
+    def _do_get(self):
+        started_at = perf_counter()
+        try:
+            return super()._do_get()
+        finally:
+            pool_checkout_time.observe(perf_counter() - started_at)
+
 engine = create_async_engine(
     DATABASE_URL,
-    echo=True
+    echo=DB_ECHO,
+    poolclass=TimedQueuePool,
+    pool_size=DB_POOL_SIZE,
+    max_overflow=DB_MAX_OVERFLOW,
+    pool_timeout=DB_POOL_TIMEOUT,
+    pool_recycle=DB_POOL_RECYCLE,
+    pool_pre_ping=DB_POOL_PRE_PING,
+    connect_args={
+        # Кэш подготовленных выражений SQLAlchemy и собственный кэш asyncpg (0 - для pgbouncer в режиме transaction)
+        'prepared_statement_cache_size': DB_STATEMENT_CACHE_SIZE,
+        'statement_cache_size': DB_STATEMENT_CACHE_SIZE
+    }
 )
 
+query_counter: ContextVar[list[int] | None] = ContextVar('query_counter', default=None)
+
+@event.listens_for(engine.sync_engine, 'before_cursor_execute')
+def count_query(conn, cursor, statement, parameters, context, executemany):
+    counter = query_counter.get()
+    if counter is not None:
+        counter[0] += 1
+
 session_local = sessionmaker(
     bind=engine,
     class_=AsyncSession,
     expire_on_commit=False
 )
 
+# create_all не меняет уже существующие таблицы, поэтому изменения схемы для БД, созданных
+# предыдущими версиями (начиная с 1.2.3), выполняются отдельно. Все выражения идемпотентны
+SCHEMA_UPGRADES = (
+    # Код Хаффмана хранится упакованным вместе с каноническим словарем. Старые строки из 0/1 без словаря
+    # не декодируются, поэтому очищаются и кодируются заново по тексту (logic.document.encode_legacy_huffman)
+    '''DO $$ BEGIN
+        IF EXISTS (
+            SELECT 1 FROM information_schema.columns
+            WHERE table_schema = current_schema() AND table_name = 'docs' AND column_name = 'huffman' AND data_type <> 'bytea'
+        ) THEN
+            ALTER TABLE docs ALTER COLUMN huffman TYPE bytea USING ''::bytea;
+        END IF;
+    END $$''',
+    "ALTER TABLE docs ADD COLUMN IF NOT EXISTS huffman_codebook JSON NOT NULL DEFAULT '{}'",
+    'ALTER TABLE docs ADD COLUMN IF NOT EXISTS huffman_bit_length BIGINT NOT NULL DEFAULT 0',
+    "ALTER TABLE collection_document ADD COLUMN IF NOT EXISTS state VARCHAR(16) NOT NULL DEFAULT 'active'",
+    'CREATE INDEX IF NOT EXISTS ix_collection_document_coll_id_state ON collection_document (coll_id, state)',
+    # Число учтенных в статистике документов коллекции (для idf) заполняется по составу коллекций
+    '''DO $$ BEGIN
+        IF NOT EXISTS (
+            SELECT 1 FROM information_schema.columns
+            WHERE table_schema = current_schema() AND table_name = 'collections' AND column_name = 'doc_count'
+        ) THEN
+            ALTER TABLE collections ADD COLUMN doc_count INTEGER NOT NULL DEFAULT 0;
+            UPDATE collections SET doc_count = counted.docs
+            FROM (
+                SELECT coll_id, count(*) AS docs FROM collection_document
+                WHERE state <> 'pending_add' GROUP BY coll_id
+            ) AS counted
+            WHERE collections.id = counted.coll_id;
+        END IF;
+    END $$''',
+    # tf и idf коллекции считаются при чтении
+    'ALTER TABLE collection_statistics DROP COLUMN IF EXISTS tf, DROP COLUMN IF EXISTS idf',
+    'CREATE INDEX IF NOT EXISTS ix_collection_statistics_coll_id_count_word ON collection_statistics (coll_id, count DESC, word)',
+    'CREATE INDEX IF NOT EXISTS ix_document_statistics_doc_id_tf_word ON document_statistics (doc_id, tf DESC, word)',
+    'CREATE INDEX IF NOT EXISTS ix_document_statistics_word_doc_id ON document_statistics (word, doc_id) INCLUDE (tf)',
+    'CREATE INDEX IF NOT EXISTS ix_docs_process_time ON docs (process_time)',
+    'CREATE INDEX IF NOT EXISTS ix_docs_created_at ON docs (created_at)',
+    *(
+        f'''DO $$ BEGIN
+            IF EXISTS (SELECT 1 FROM pg_constraint WHERE conname = '{table}_doc_id_fkey' AND confdeltype <> 'c') THEN
+                ALTER TABLE {table} DROP CONSTRAINT {table}_doc_id_fkey,
+                    ADD CONSTRAINT {table}_doc_id_fkey FOREIGN KEY (doc_id) REFERENCES docs (id) ON DELETE CASCADE;
+            END IF;
+        END $$'''
+        for table in ('document_statistics', 'collection_document')
+    )
+)
+
 async def init_db():
     async with engine.begin() as conn:
         await conn.run_sync(Base.metadata.create_all)
+        for statement in SCHEMA_UPGRADES:
+            await conn.exec_driver_sql(statement)
 
 async def get_db() -> AsyncGenerator[AsyncSession, None]:
     async with session_local() as session:
@@ -0,0 +1,111 @@
+import asyncio
+import importlib
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from time import perf_counter
+from typing import Callable, TypeVar
+
+from core.config import ANALYSIS_INLINE_THRESHOLD, ANALYSIS_QUEUE_SIZE, ANALYSIS_WORKERS, PASSWORD_HASH_WORKERS
+from core.metrics import summary
+from exceptions import server_busy_503
+
+T = TypeVar('T')
+
+def _import_modules(modules: tuple[str, ...]):
+    for module in modules:
+        importlib.import_module(module)
+
+class AnalysisPool:
+    '''Пул процессов для CPU-bound обработки текстов.
+    Небольшие задачи (size < inline_threshold) выполняются в текущем процессе.
+    Одновременно принимается не больше workers + queue_size задач, остальные получают 503'''
+
+    def __init__(self, workers: int, queue_size: int, inline_threshold: int):
+        self.workers = workers
+        self.queue_size = queue_size
+        self.inline_threshold = inline_threshold
+        self.pending = 0
+        self._executor: ProcessPoolExecutor | None = None
+
+    def start(self):
+        if self._executor is None and self.workers > 0:
+            self._executor = ProcessPoolExecutor(
+                max_workers=self.workers,
+                mp_context=multiprocessing.get_context('spawn')
+            )
+
+    def shutdown(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=True, cancel_futures=True)
+            self._executor = None
+
+    async def warmup(self, modules: tuple[str, ...]):
+        '''Запуск процессов пула и импорт модулей в них до первого запроса'''
+        if self._executor is None:
+            return
+        loop = asyncio.get_running_loop()
+        await asyncio.gather(*(
+            loop.run_in_executor(self._executor, _import_modules, modules)
+            for _ in range(self.workers)
+        ))
+
+    @property
+    def saturated(self) -> bool:
+        return self.pending >= self.workers + self.queue_size
+
+    async def run(self, func: Callable[..., T], *args, size: int) -> T:
+        if self._executor is None or size < self.inline_threshold:
+            return func(*args)
+        if self.saturated:
+            raise server_busy_503
+
+        self.pending += 1
+        try:
+            return await asyncio.get_running_loop().run_in_executor(self._executor, func, *args)
+        finally:
+            self.pending -= 1
+
+analysis_pool = AnalysisPool(
+    workers=ANALYSIS_WORKERS,
+    queue_size=ANALYSIS_QUEUE_SIZE,
+    inline_threshold=ANALYSIS_INLINE_THRESHOLD
+)
+
+class ThreadPool:
+    '''Пул потоков для блокирующих вызовов, которые отпускают GIL (bcrypt).
+    Одновременно выполняется не больше workers вызовов: остальные ждут семафор в event loop,
+    а не в очереди исполнителя, поэтому ожидание можно измерить и отменить вместе с запросом'''
+
+    def __init__(self, name: str, workers: int):
+        self.name = name
+        self.workers = workers
+        self.in_progress = 0
+        self.queue_time = summary(f'{name}_queue_seconds', f'Time {name} calls wait for a free thread')
+        self._executor: ThreadPoolExecutor | None = None
+        self._semaphore: asyncio.Semaphore | None = None
+
+    def start(self):
+        if self._executor is None and self.workers > 0:
+            self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix=self.name)
+            self._semaphore = asyncio.Semaphore(self.workers)
+
+    def shutdown(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=True, cancel_futures=True)
+            self._executor = None
+            self._semaphore = None
+
+    async def run(self, func: Callable[..., T], *args) -> T:
+        if self._executor is None:
+            return func(*args)
+
+        queued_at = perf_counter()
+        async with self._semaphore:
+            self.queue_time.observe(perf_counter() - queued_at)
+            self.in_progress += 1
+            try:
+                return await asyncio.get_running_loop().run_in_executor(self._executor, func, *args)
+            finally:
+                self.in_progress -= 1
+
+password_pool = ThreadPool('password_hash', PASSWORD_HASH_WORKERS)
\ No newline at end of file
@@ -1,6 +1,6 @@
 import datetime
 
-from sqlalchemy import DateTime, Integer, String, Text, Float, ForeignKey
+from sqlalchemy import JSON, BigInteger, DateTime, Index, Integer, LargeBinary, String, Text, Float, ForeignKey
 from sqlalchemy.orm import relationship, mapped_column, Mapped
 from sqlalchemy.dialects.postgresql import UUID
 
@@ -26,7 +26,9 @@ class Document(Base):
     id: Mapped[UUID] = mapped_column(UUID(as_uuid=True), primary_key=True, default=uuid4)
     name: Mapped[str] = mapped_column(String)
     text: Mapped[str] = mapped_column(Text)
-    huffman: Mapped[str] = mapped_column(String, nullable=False)
+    huffman: Mapped[bytes] = mapped_column(LargeBinary, nullable=False)
+    huffman_codebook: Mapped[dict[str, int]] = mapped_column(JSON, nullable=False, default=dict)
+    huffman_bit_length: Mapped[int] = mapped_column(BigInteger, nullable=False, default=0)
     length: Mapped[int] = mapped_column(Integer, default=0)
     created_at: Mapped[datetime.datetime] = mapped_column(DateTime(timezone=True), default=datetime.datetime.now(datetime.UTC))
     process_time: Mapped[float] = mapped_column(Float, nullable=True)
@@ -37,22 +39,31 @@ class Document(Base):
     collections: Mapped[list['Collection']] = relationship(
         'Collection',
         secondary='collection_document',
-        back_populates='documents'
+        back_populates='documents',
+        passive_deletes=True
     )
 
+    # Строки статистики и связи с коллекциями удаляет сама БД (ON DELETE CASCADE), без загрузки в сессию
     statistics: Mapped[list['DocumentStatistic']] = relationship(
         'DocumentStatistic',
         back_populates='document',
-        cascade='all, delete-orphan'
+        cascade='all, delete-orphan',
+        passive_deletes=True
     )
 
 
+# min/max времени обработки и время последней загрузки для /api/info/metrics читаются с края индекса
+Index('ix_docs_process_time', Document.process_time)
+Index('ix_docs_created_at', Document.created_at)
+
+
 class Collection(Base):
     __tablename__ = 'collections'
 
     id: Mapped[UUID] = mapped_column(UUID(as_uuid=True), primary_key=True, default=uuid4)
     name: Mapped[str] = mapped_column(String, nullable=True)
     total_words: Mapped[int] = mapped_column(Integer, nullable=False, default=0)
+    doc_count: Mapped[int] = mapped_column(Integer, nullable=False, default=0)
 
     author_id: Mapped[UUID] = mapped_column(ForeignKey('users.id'), nullable=False)
     author: Mapped['User'] = relationship('User', back_populates='collections')
@@ -73,20 +84,46 @@ class Collection(Base):
 class CollectionDocument(Base):
     __tablename__ = 'collection_document'
     
-    doc_id: Mapped[UUID] = mapped_column(ForeignKey('docs.id'), primary_key=True)
+    doc_id: Mapped[UUID] = mapped_column(ForeignKey('docs.id', ondelete='CASCADE'), primary_key=True)
     coll_id: Mapped[UUID] = mapped_column(ForeignKey('collections.id'), primary_key=True)
+    # active - статистика документа учтена в коллекции; pending_add/pending_remove - изменение
+    # записано, но еще не применено к статистике фоновым пересчетом (COLLECTION_STATS_BACKGROUND)
+    state: Mapped[str] = mapped_column(String(16), nullable=False, default='active', server_default='active')
+
+
+Index(
+    'ix_collection_document_coll_id_state',
+    CollectionDocument.coll_id,
+    CollectionDocument.state
+)
 
 
 class DocumentStatistic(Base):
     __tablename__ = 'document_statistics'
 
-    doc_id: Mapped[UUID] = mapped_column(ForeignKey('docs.id'), primary_key=True)
+    doc_id: Mapped[UUID] = mapped_column(ForeignKey('docs.id', ondelete='CASCADE'), primary_key=True)
     word: Mapped[str] = mapped_column(String, primary_key=True)
 
     count: Mapped[int] = mapped_column(Integer, nullable=False, default=0)
     tf: Mapped[float] = mapped_column(Float, nullable=False, default=0.0)
 
     document: Mapped['Document'] = relationship('Document', back_populates='statistics')
+
+
+Index(
+    'ix_document_statistics_doc_id_tf_word',
+    DocumentStatistic.doc_id,
+    DocumentStatistic.tf.desc(),
+    DocumentStatistic.word
+)
+
+# Обратный индекс для поиска: документы со словом читаются вместе с tf без обращения к таблице
+Index(
+    'ix_document_statistics_word_doc_id',
+    DocumentStatistic.word,
+    DocumentStatistic.doc_id,
+    postgresql_include=['tf']
+)
     
 
 class CollectionStatistic(Base):
@@ -96,8 +133,35 @@ class CollectionStatistic(Base):
     word: Mapped[str] = mapped_column(String, primary_key=True)
 
     count: Mapped[int] = mapped_column(Integer, nullable=False, default=0)
-    tf: Mapped[float] = mapped_column(Float, nullable=False, default=0.0)
     word_doc_occurrences: Mapped[int] = mapped_column(Integer, nullable=False, default=0)
-    idf: Mapped[float] = mapped_column(Float, nullable=False, default=0.0)
 
-    collection: Mapped['Collection'] = relationship('Collection', back_populates='statistics')
\ No newline at end of file
+    collection: Mapped['Collection'] = relationship('Collection', back_populates='statistics')
+
+
+Index(
+    'ix_collection_statistics_coll_id_count_word',
+    CollectionStatistic.coll_id,
+    CollectionStatistic.count.desc(),
+    CollectionStatistic.word
+)
+
+
+class ServiceCounters(Base):
+    __tablename__ = 'service_counters'
+
+    # Одна строка (id=1) с агрегатами для /api/info/metrics, обновляется в транзакциях,
+    # создающих и удаляющих документы и пользователей
+    id: Mapped[int] = mapped_column(Integer, primary_key=True, default=1)
+    users: Mapped[int] = mapped_column(BigInteger, nullable=False, default=0)
+    docs: Mapped[int] = mapped_column(BigInteger, nullable=False, default=0)
+    total_words: Mapped[int] = mapped_column(BigInteger, nullable=False, default=0)
+    process_time_sum: Mapped[float] = mapped_column(Float, nullable=False, default=0.0)
+    process_time_count: Mapped[int] = mapped_column(BigInteger, nullable=False, default=0)
+
+
+class ProcessTimeBucket(Base):
+    __tablename__ = 'process_time_buckets'
+
+    # Корзины скетча квантилей времени обработки документов (core.metrics.QuantileSketch)
+    key: Mapped[int] = mapped_column(Integer, primary_key=True)
+    count: Mapped[int] = mapped_column(BigInteger, nullable=False, default=0)
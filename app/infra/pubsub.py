@@ -0,0 +1,44 @@
+import asyncio
+import logging
+from typing import Awaitable, Callable
+
+from redis import Redis
+from redis.exceptions import RedisError
+
+logger = logging.getLogger(__name__)
+
+RESUBSCRIBE_DELAY = 1
+
+async def listen_channel(
+    client: Redis,
+    channel: str,
+    on_message: Callable[[str], None],
+    on_subscribe: Callable[[], Awaitable[None]] | None = None,
+    on_disconnect: Callable[[], None] | None = None
+    ):
+    '''Бесконечное чтение канала Redis pub/sub с переподпиской после обрыва соединения.
+    on_subscribe вызывается после каждой (пере)подписки: сообщения, отправленные до нее, могли быть пропущены'''
+    while True:
+        try:
+            async with client.pubsub() as pubsub:
+                await pubsub.subscribe(channel)
+                if on_subscribe is not None:
+                    await on_subscribe()
+                async for message in pubsub.listen():
+                    if message['type'] == 'message':
+                        data = message['data']
+                        on_message(data.decode() if isinstance(data, bytes) else data)
+        except RedisError:
+            logger.warning('Redis channel %s is unavailable', channel, exc_info=True)
+        if on_disconnect is not None:
+            on_disconnect()
+        await asyncio.sleep(RESUBSCRIBE_DELAY)
+
+async def cancel_task(task: asyncio.Task | None):
+    if task is None:
+        return
+    task.cancel()
+    try:
+        await task
+    except asyncio.CancelledError:
+        pass
@@ -0,0 +1,59 @@
+import asyncio
+
+from redis.exceptions import RedisError
+
+from auth.blacklist import redis_client
+from core.config import COLLECTION_STATS_QUEUE
+
+class MemoryQueue:
+    '''Очередь id в памяти процесса с объединением повторов: id, уже ожидающий обработки, второй раз не добавляется'''
+
+    def __init__(self):
+        self._queue: asyncio.Queue[str] = asyncio.Queue()
+        self._pending: set[str] = set()
+
+    async def put(self, item: str):
+        if item not in self._pending:
+            self._pending.add(item)
+            self._queue.put_nowait(item)
+
+    async def get(self) -> str:
+        item = await self._queue.get()
+        self._pending.discard(item)
+        return item
+
+    async def size(self) -> int:
+        return len(self._pending)
+
+class RedisQueue:
+    '''Очередь id в Redis, общая для всех процессов: список name и множество ожидающих id name:pending.
+    Повторы объединяются при чтении: id обрабатывается, только если он еще есть в множестве'''
+
+    POLL_TIMEOUT = 1
+
+    def __init__(self, name: str):
+        self.name = name
+        self.pending_key = f'{name}:pending'
+
+    async def put(self, item: str):
+        async with redis_client.pipeline(transaction=True) as pipe:
+            pipe.sadd(self.pending_key, item)
+            pipe.lpush(self.name, item)
+            await pipe.execute()
+
+    async def get(self) -> str:
+        while True:
+            try:
+                popped = await redis_client.brpop([self.name], timeout=self.POLL_TIMEOUT)
+                if popped is None:
+                    continue
+                item = popped[1].decode()
+                if await redis_client.srem(self.pending_key, item):
+                    return item
+            except RedisError:
+                await asyncio.sleep(self.POLL_TIMEOUT)
+
+    async def size(self) -> int:
+        return await redis_client.scard(self.pending_key)
+
+collection_stats_queue = RedisQueue('collection:stats:queue') if COLLECTION_STATS_QUEUE == 'redis' else MemoryQueue()
@@ -0,0 +1,51 @@
+import asyncio
+import logging
+import os
+from functools import partial
+from time import perf_counter
+
+from sqlalchemy import text
+from redis.exceptions import RedisError
+
+from auth.blacklist import redis_client
+from core.config import WARMUP_DB_CONNECTIONS
+from infra.database import engine
+from infra.executor import analysis_pool
+
+logger = logging.getLogger('uvicorn.error')
+
+ANALYSIS_MODULES = ('logic.analysis', 'logic.huffman', 'logic.text_utils')
+
+async def _open_db_connection():
+    async with engine.connect() as conn:
+        await conn.execute(text('SELECT 1'))
+
+async def warm_db():
+    '''Открытие соединений пула заранее: они возвращаются в пул и используются первыми запросами'''
+    await asyncio.gather(*(_open_db_connection() for _ in range(WARMUP_DB_CONNECTIONS)))
+
+async def warm_redis():
+    try:
+        await redis_client.ping()
+    except RedisError:
+        logger.warning('Warmup: Redis is unavailable', exc_info=True)
+
+async def warmup(started_at: float):
+    '''Прогрев процесса перед приемом запросов: пул соединений с БД, Redis, процессы пула обработки текстов.
+    Время каждого шага и общее время запуска пишутся в лог для каждого воркера'''
+    timings = {}
+    for name, step in (
+        ('db', warm_db),
+        ('redis', warm_redis),
+        ('analysis pool', partial(analysis_pool.warmup, ANALYSIS_MODULES))
+    ):
+        step_started_at = perf_counter()
+        await step()
+        timings[name] = perf_counter() - step_started_at
+
+    logger.info(
+        'Worker %s started in %.2f s (%s)',
+        os.getpid(),
+        perf_counter() - started_at,
+        ', '.join(f'{name} {elapsed:.2f} s' for name, elapsed in timings.items())
+    )
@@ -0,0 +1,134 @@
+import codecs
+import os
+from collections import Counter
+from dataclasses import dataclass, field
+from tempfile import NamedTemporaryFile
+
+from fastapi import UploadFile
+
+from core.config import ANALYSIS_INLINE_THRESHOLD, MAX_UPLOAD_SIZE, UPLOAD_CHUNK_SIZE
+from core.metrics import stage
+from exceptions import file_too_large_413, invalid_encoding_400
+from infra.executor import analysis_pool
+from logic.huffman import EncodedText, HuffmanEncoder, encode, get_code_lengths
+from logic.text_utils import WordCounter, count_words
+
+@dataclass
+class TextAnalysis:
+    length: int
+    word_counts: dict[str, int]
+    huffman: EncodedText
+    # Время этапов (INSTRUMENTATION_ENABLED), замеренное в пуле процессов; учитывается при создании документа
+    timings: dict[str, float] = field(default_factory=dict)
+
+def analyze_text(text: str) -> TextAnalysis:
+    '''CPU-часть обработки документа. Выполняется в пуле процессов, поэтому результат должен сериализоваться'''
+    timings = {}
+    with stage('count_words', timings):
+        length, word_counts = count_words(text)
+    with stage('huffman_tree', timings):
+        code_lengths = get_code_lengths(Counter(text))
+    with stage('huffman_encode', timings):
+        huffman = encode(text, code_lengths)
+    return TextAnalysis(length=length, word_counts=dict(word_counts), huffman=huffman, timings=timings)
+
+class StreamingAnalyzer:
+    '''Разбор текста по частям: инкрементальное декодирование UTF-8, подсчет слов и частот символов.
+    Декодированный текст не накапливается'''
+
+    def __init__(self, max_size: int = MAX_UPLOAD_SIZE):
+        self.max_size = max_size
+        self.size = 0
+        self.char_counts: Counter[str] = Counter()
+        self._decoder = codecs.getincrementaldecoder('utf-8')()
+        self._words = WordCounter()
+
+    def feed(self, data: bytes):
+        self.size += len(data)
+        if self.size > self.max_size:
+            raise file_too_large_413
+        try:
+            chunk = self._decoder.decode(data)
+        except UnicodeDecodeError:
+            raise invalid_encoding_400
+        self._consume(chunk)
+
+    def _consume(self, chunk: str):
+        if chunk:
+            self._words.feed(chunk)
+            self.char_counts.update(chunk)
+
+    def finish(self) -> tuple[int, Counter[str]]:
+        try:
+            self._consume(self._decoder.decode(b'', final=True))
+        except UnicodeDecodeError:
+            raise invalid_encoding_400
+        return self._words.close()
+
+def analyze_file(path: str) -> TextAnalysis:
+    '''CPU-часть обработки загруженного файла в пуле процессов. Первый проход по файлу считает слова
+    и частоты символов, второй кодирует текст по полученным длинам кодов. Текст читается частями
+    по UPLOAD_CHUNK_SIZE и не передается между процессами'''
+    timings = {}
+    analyzer = StreamingAnalyzer()
+    with stage('count_words', timings):
+        with open(path, 'rb') as file:
+            while data := file.read(UPLOAD_CHUNK_SIZE):
+                analyzer.feed(data)
+        length, word_counts = analyzer.finish()
+    with stage('huffman_tree', timings):
+        code_lengths = get_code_lengths(analyzer.char_counts)
+    with stage('huffman_encode', timings):
+        encoder = HuffmanEncoder(code_lengths)
+        # newline='' - без замены \r\n, иначе второй проход не совпадет с частотами первого
+        with open(path, encoding='utf-8', newline='') as file:
+            while chunk := file.read(UPLOAD_CHUNK_SIZE):
+                encoder.feed(chunk)
+        huffman = encoder.finish()
+    return TextAnalysis(length=length, word_counts=dict(word_counts), huffman=huffman, timings=timings)
+
+async def analyze_upload(file: UploadFile) -> tuple[str, TextAnalysis]:
+    '''Потоковое чтение загруженного файла частями по UPLOAD_CHUNK_SIZE байт с проверкой размера и UTF-8.
+    Файлы меньше ANALYSIS_INLINE_THRESHOLD байт разбираются в памяти. Большие пишутся во временный файл,
+    который разбирает analyze_file в пуле процессов. Текст целиком читается из файла один раз - для Document.text'''
+    if file.size is not None and file.size > MAX_UPLOAD_SIZE:
+        raise file_too_large_413
+
+    decoder = codecs.getincrementaldecoder('utf-8')()
+    head = bytearray()
+    size = 0
+    spool = None
+    try:
+        while data := await file.read(UPLOAD_CHUNK_SIZE):
+            size += len(data)
+            if size > MAX_UPLOAD_SIZE:
+                raise file_too_large_413
+            try:
+                decoder.decode(data)
+            except UnicodeDecodeError:
+                raise invalid_encoding_400
+            if spool is None and size >= ANALYSIS_INLINE_THRESHOLD:
+                spool = NamedTemporaryFile(prefix='upload-', suffix='.txt', delete=False)
+                spool.write(head)
+                head = bytearray()
+            if spool is None:
+                head += data
+            else:
+                spool.write(data)
+        try:
+            decoder.decode(b'', final=True)
+        except UnicodeDecodeError:
+            raise invalid_encoding_400
+
+        if spool is None:
+            text = head.decode('utf-8')
+            return text, await analysis_pool.run(analyze_text, text, size=size)
+        spool.close()
+        analysis = await analysis_pool.run(analyze_file, spool.name, size=size)
+        with open(spool.name, encoding='utf-8', newline='') as text_file:
+            text = text_file.read()
+        return text, analysis
+    finally:
+        if spool is not None:
+            spool.close()
+            os.unlink(spool.name)
\ No newline at end of file
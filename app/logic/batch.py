@@ -0,0 +1,99 @@
+import asyncio
+import time
+import zipfile
+from dataclasses import dataclass
+from pathlib import PurePosixPath
+from typing import Awaitable, Callable
+
+from fastapi import HTTPException, UploadFile
+
+from core.config import BATCH_UPLOAD_MAX_FILES, BATCH_UPLOAD_MAX_SIZE, MAX_UPLOAD_SIZE
+from exceptions import batch_too_large_413, file_too_large_413, invalid_encoding_400
+from infra.executor import analysis_pool
+from logic.analysis import TextAnalysis, analyze_text
+
+@dataclass
+class BatchFile:
+    filename: str
+    text: str | None = None
+    analysis: TextAnalysis | None = None
+    error: str | None = None
+    start_time: float = 0.0
+
+    @property
+    def doc_name(self) -> str:
+        return PurePosixPath(self.filename).name.removesuffix('.txt')
+
+@dataclass
+class BatchEntry:
+    filename: str
+    size: int | None
+    read: Callable[[], Awaitable[bytes]] | None = None
+    error: str | None = None
+
+def _zip_entries(file: UploadFile) -> list[BatchEntry]:
+    try:
+        archive = zipfile.ZipFile(file.file)
+    except zipfile.BadZipFile:
+        return [BatchEntry(file.filename, None, error='Invalid zip archive')]
+
+    entries = []
+    for member in archive.infolist():
+        path = PurePosixPath(member.filename)
+        if member.is_dir() or path.parts[0] == '__MACOSX':
+            continue
+        if path.suffix != '.txt':
+            entries.append(BatchEntry(member.filename, None, error='Invalid file extension. Valid only *.txt'))
+            continue
+        # ZipExtFile не распаковывает больше заявленного file_size, поэтому проверка размера до чтения достаточна
+        entries.append(BatchEntry(member.filename, member.file_size, lambda member=member: asyncio.to_thread(archive.read, member)))
+    return entries
+
+def collect_entries(files: list[UploadFile]) -> list[BatchEntry]:
+    '''Список файлов пакета: *.txt как есть, *.zip - все *.txt внутри архива.
+    Ограничения на число файлов и общий размер проверяются до чтения содержимого'''
+    entries = []
+    for file in files:
+        if file.filename.endswith('.zip'):
+            entries.extend(_zip_entries(file))
+        elif file.filename.endswith('.txt'):
+            entries.append(BatchEntry(file.filename, file.size, file.read))
+        else:
+            entries.append(BatchEntry(file.filename, None, error='Invalid file extension. Valid only *.txt or *.zip'))
+
+    if len(entries) > BATCH_UPLOAD_MAX_FILES:
+        raise batch_too_large_413
+    if sum(entry.size or 0 for entry in entries) > BATCH_UPLOAD_MAX_SIZE:
+        raise batch_too_large_413
+    return entries
+
+async def _analyze_entry(entry: BatchEntry, semaphore: asyncio.Semaphore) -> BatchFile:
+    if entry.error is not None:
+        return BatchFile(entry.filename, error=entry.error)
+
+    async with semaphore:
+        start_time = time.monotonic()
+        try:
+            if entry.size is not None and entry.size > MAX_UPLOAD_SIZE:
+                raise file_too_large_413
+            data = await entry.read()
+            if len(data) > MAX_UPLOAD_SIZE:
+                raise file_too_large_413
+            try:
+                text = data.decode('utf-8')
+            except UnicodeDecodeError:
+                raise invalid_encoding_400
+            if not text:
+                return BatchFile(entry.filename, error='File is empty')
+            analysis = await analysis_pool.run(analyze_text, text, size=len(text))
+        except HTTPException as exc:
+            return BatchFile(entry.filename, error=exc.detail)
+    return BatchFile(entry.filename, text, analysis, start_time=start_time)
+
+async def analyze_batch(files: list[UploadFile]) -> list[BatchFile]:
+    '''Обработка файлов пакета в пуле процессов. Одновременно обрабатывается не больше файлов,
+    чем процессов в пуле, поэтому пакет не переполняет очередь пула сам по себе.
+    Ошибка в отдельном файле не прерывает пакет, а попадает в результат этого файла'''
+    entries = collect_entries(files)
+    semaphore = asyncio.Semaphore(max(analysis_pool.workers, 1))
+    return await asyncio.gather(*(_analyze_entry(entry, semaphore) for entry in entries))
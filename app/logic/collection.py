@@ -1,12 +1,20 @@
-from math import log10
+import heapq
+from collections import defaultdict
 from typing import Sequence
+from uuid import UUID
 
-from sqlalchemy import desc, select
+from sqlalchemy import Float, Integer, Row, cast, delete, desc, func, literal, select, update
+from sqlalchemy.dialects.postgresql import insert
 from sqlalchemy.orm import selectinload
 from sqlalchemy.ext.asyncio import AsyncSession
 
-from infra.models import Collection, Document, CollectionStatistic
-from logic.document import get_doc_by_id
+from core.config import COLLECTION_STATS_BACKGROUND
+from core.metrics import timed_stage
+from infra.cache import stats_cache
+from infra.queue import collection_stats_queue
+from infra.models import Collection, CollectionDocument, CollectionStatistic, Document, DocumentStatistic
+from logic.similarity import similarity_indexes
+from logic.text_utils import split_text
 
 async def create_coll(db: AsyncSession, user_id: str, coll_name: str | None = None) -> Collection:
     collection = Collection(author_id=user_id)
@@ -21,16 +29,14 @@ async def create_coll(db: AsyncSession, user_id: str, coll_name: str | None = No
     return collection
     
 async def get_coll(db: AsyncSession, collection_id: str) -> Collection:
-    collection = await db.execute(
-        select(Collection)
-        .options(
-            selectinload(Collection.documents),
-            selectinload(Collection.statistics)
-            )
-        .where(Collection.id == collection_id)
-        )
+    collection = await db.execute(select(Collection).where(Collection.id == collection_id))
     return collection.scalar_one_or_none()
     
+async def get_coll_author(db: AsyncSession, collection_id: str) -> UUID | None:
+    '''Проверка существования и владельца коллекции одним запросом к одному столбцу'''
+    author_id = await db.execute(select(Collection.author_id).where(Collection.id == collection_id))
+    return author_id.scalar_one_or_none()
+    
 async def get_colls(db: AsyncSession, user_id: str) -> Sequence[Collection]:
     collections = await db.execute(select(Collection).where(Collection.author_id == user_id))
     return collections.scalars().all()
@@ -38,102 +44,376 @@ async def get_colls(db: AsyncSession, user_id: str) -> Sequence[Collection]:
 async def delete_coll(db: AsyncSession, collection_id: str) -> Collection:
     collections = await get_coll(db, collection_id)
     if collections:
+        await db.execute(delete(CollectionStatistic).where(CollectionStatistic.coll_id == collection_id))
+        await db.execute(delete(CollectionDocument).where(CollectionDocument.coll_id == collection_id))
         await db.delete(collections)
         await db.commit()   
+        await stats_cache.bump_version('collection', collection_id)
     return collections
     
+async def get_coll_documents(db: AsyncSession, collection_id: str) -> Collection:
+    collection = await db.execute(
+        select(Collection)
+        .options(
+            selectinload(Collection.documents.and_(CollectionDocument.state != 'pending_remove'))
+            .load_only(Document.id, Document.name)
+        )
+        .where(Collection.id == collection_id)
+        .execution_options(populate_existing=True)
+        )
+    return collection.scalar_one_or_none()
+    
 async def add_doc_to_collection(db: AsyncSession, collection_id: str, doc_id: str) -> Collection:
-    collection = await get_coll(db, collection_id)
-    if not collection:
-        return
-    doc = await get_doc_by_id(db, doc_id)
-    if not doc:
-        return
-    if doc not in collection.documents:
-        collection.documents.append(doc)
-        collection.total_words += doc.length
-        await update_collection_statistics(db, collection, doc)
+    return await add_docs_to_collection(db, collection_id, [doc_id])
+    
+async def add_docs_to_collection(db: AsyncSession, collection_id: str, doc_ids: Sequence[UUID]) -> Collection:
+    if await attach_docs_to_collection(db, collection_id, doc_ids):
         await db.commit()
-    return collection
+        await collection_changed(db, collection_id, added=doc_ids)
+    return await get_coll_documents(db, collection_id)
     
-async def delete_doc_from_collection(db: AsyncSession, collection_id: str, doc_id: str) -> Collection:
-    collection = await get_coll(db, collection_id)
-    if not collection:
-        return
-    doc = await get_doc_by_id(db, doc_id)
-    if not doc:
-        return
-    if doc in collection.documents:
-        collection.documents.remove(doc)
-        collection.total_words -= doc.length
-        await update_collection_statistics(db, collection, doc, False)
+async def delete_doc_from_collection(
+    db: AsyncSession,
+    collection_id: str,
+    doc_id: str,
+    background: bool = COLLECTION_STATS_BACKGROUND
+    ) -> Collection:
+    return await delete_docs_from_collection(db, collection_id, [doc_id], background)
+    
+async def delete_docs_from_collection(
+    db: AsyncSession,
+    collection_id: str,
+    doc_ids: Sequence[UUID],
+    background: bool = COLLECTION_STATS_BACKGROUND
+    ) -> Collection:
+    if await detach_docs_from_collection(db, collection_id, doc_ids, background):
         await db.commit()
-    return collection
+        await collection_changed(db, collection_id, removed=doc_ids, background=background)
+    return await get_coll_documents(db, collection_id)
+    
+async def attach_docs_to_collection(
+    db: AsyncSession,
+    collection_id: str,
+    doc_ids: Sequence[UUID],
+    background: bool = COLLECTION_STATS_BACKGROUND
+    ) -> bool:
+    '''Добавление документов в коллекцию без коммита (в транзакции вызывающего).
+    Новые документы записываются как pending_add, ожидающие удаления (pending_remove) снова становятся active.
+    В фоновом режиме статистика пересчитывается воркером, иначе - сразу. Возвращает, изменился ли состав'''
+    if not background:
+        await lock_collection(db, collection_id)
+    merge = insert(CollectionDocument).values([
+        {'coll_id': collection_id, 'doc_id': doc_id, 'state': 'pending_add'}
+        for doc_id in sorted(doc_ids, key=str)
+    ])
+    changed = await db.execute(
+        merge.on_conflict_do_update(
+            index_elements=[CollectionDocument.doc_id, CollectionDocument.coll_id],
+            set_={'state': 'active'},
+            where=CollectionDocument.state == 'pending_remove'
+        )
+        .returning(CollectionDocument.doc_id)
+    )
+    if not changed.first():
+        return False
+    if not background:
+        await apply_membership_changes(db, collection_id)
+    return True
+    
+async def detach_docs_from_collection(
+    db: AsyncSession,
+    collection_id: str,
+    doc_ids: Sequence[UUID],
+    background: bool = COLLECTION_STATS_BACKGROUND
+    ) -> bool:
+    '''Удаление документов из коллекции без коммита. Еще не примененные добавления (pending_add) просто удаляются,
+    active помечаются pending_remove и вычитаются из статистики сразу или воркером'''
+    if not background:
+        await lock_collection(db, collection_id)
+    cancelled = await db.execute(
+        delete(CollectionDocument)
+        .where(
+            CollectionDocument.coll_id == collection_id,
+            CollectionDocument.doc_id.in_(doc_ids),
+            CollectionDocument.state == 'pending_add'
+        )
+        .returning(CollectionDocument.doc_id)
+    )
+    marked = await db.execute(
+        update(CollectionDocument)
+        .where(
+            CollectionDocument.coll_id == collection_id,
+            CollectionDocument.doc_id.in_(doc_ids),
+            CollectionDocument.state == 'active'
+        )
+        .values(state='pending_remove')
+        .returning(CollectionDocument.doc_id)
+    )
+    changed = bool(cancelled.all()) | bool(marked.all())
+    if changed and not background:
+        await apply_membership_changes(db, collection_id)
+    return changed
+    
+async def lock_collection(db: AsyncSession, collection_id: str) -> bool:
+    '''Блокировка строки коллекции до конца транзакции. При пересчете статистики сразу берется до изменения
+    строк collection_document, чтобы два запроса не ждали строки друг друга. FOR NO KEY UPDATE не конфликтует
+    с FOR KEY SHARE, который берут вставки в collection_document по внешнему ключу'''
+    locked = await db.execute(select(Collection.id).where(Collection.id == collection_id).with_for_update(key_share=True))
+    return locked.scalar_one_or_none() is not None
+    
+async def apply_membership_changes(db: AsyncSession, collection_id: str) -> int:
+    '''Применение всех накопленных изменений состава коллекции к ее статистике одним слиянием на добавление
+    и одним на удаление. Строка коллекции блокируется, поэтому запросы и воркеры разных процессов
+    не применяют одно изменение дважды. Возвращает число примененных изменений'''
+    if not await lock_collection(db, collection_id):
+        return 0
+    
+    added = await db.execute(
+        update(CollectionDocument)
+        .where(CollectionDocument.coll_id == collection_id, CollectionDocument.state == 'pending_add')
+        .values(state='active')
+        .returning(CollectionDocument.doc_id)
+    )
+    added_ids = added.scalars().all()
+    if added_ids:
+        await update_collection_statistics(db, collection_id, added_ids)
+    
+    removed = await db.execute(
+        delete(CollectionDocument)
+        .where(CollectionDocument.coll_id == collection_id, CollectionDocument.state == 'pending_remove')
+        .returning(CollectionDocument.doc_id)
+    )
+    removed_ids = removed.scalars().all()
+    if removed_ids:
+        await update_collection_statistics(db, collection_id, removed_ids, False)
+    return len(added_ids) + len(removed_ids)
+    
+async def detach_doc_from_collections(db: AsyncSession, doc_id: str) -> Sequence[UUID]:
+    '''Вычитание документа из статистики всех его коллекций без коммита, перед удалением документа.
+    Строки коллекций блокируются (в порядке id, как и в apply_membership_changes), затем одно обновление
+    объединяет статистику документа со статистикой всех коллекций, где он учтен (active и pending_remove;
+    pending_add еще не учтены). Работа пропорциональна словарю документа, а не словарям коллекций.
+    Сами строки collection_document удаляются вместе с документом (ON DELETE CASCADE).
+    Возвращает id всех коллекций документа'''
+    locked = await db.execute(
+        select(Collection.id)
+        .join(CollectionDocument, CollectionDocument.coll_id == Collection.id)
+        .where(CollectionDocument.doc_id == doc_id)
+        .order_by(Collection.id)
+        .with_for_update(of=Collection, key_share=True)
+    )
+    collection_ids = locked.scalars().all()
+    if not collection_ids:
+        return collection_ids
+    
+    # Состояние читается после блокировки: воркер мог применить изменения, пока запрос ждал
+    counted = await db.execute(
+        select(CollectionDocument.coll_id)
+        .where(CollectionDocument.doc_id == doc_id, CollectionDocument.state != 'pending_add')
+    )
+    counted_ids = counted.scalars().all()
+    if not counted_ids:
+        return collection_ids
+    
+    await db.execute(
+        update(CollectionStatistic)
+        .where(
+            CollectionStatistic.coll_id.in_(counted_ids),
+            DocumentStatistic.doc_id == doc_id,
+            CollectionStatistic.word == DocumentStatistic.word
+        )
+        .values(
+            count=CollectionStatistic.count - DocumentStatistic.count,
+            word_doc_occurrences=CollectionStatistic.word_doc_occurrences - 1
+        )
+    )
+    await db.execute(
+        delete(CollectionStatistic)
+        .where(
+            CollectionStatistic.coll_id.in_(counted_ids),
+            CollectionStatistic.word.in_(select(DocumentStatistic.word).where(DocumentStatistic.doc_id == doc_id)),
+            (CollectionStatistic.count <= 0) | (CollectionStatistic.word_doc_occurrences <= 0)
+        )
+    )
+    doc_length = select(Document.length).where(Document.id == doc_id).scalar_subquery()
+    await db.execute(
+        update(Collection)
+        .where(Collection.id.in_(counted_ids))
+        .values(total_words=Collection.total_words - doc_length, doc_count=Collection.doc_count - 1)
+    )
+    return collection_ids
+    
+async def collection_changed(
+    db: AsyncSession,
+    collection_id: str,
+    added: Sequence[UUID] = (),
+    removed: Sequence[UUID] = (),
+    background: bool = COLLECTION_STATS_BACKGROUND
+    ):
+    '''После коммита изменения состава: сброс кэша страниц статистики, перевод индекса похожих документов
+    на новую версию и постановка коллекции в очередь пересчета'''
+    version = await stats_cache.bump_version('collection', collection_id)
+    await similarity_indexes.update(db, collection_id, version, added, removed)
+    if background:
+        await collection_stats_queue.put(str(collection_id))
+    
+async def get_coll_pending(db: AsyncSession, collection_id: str) -> int:
+    '''Число изменений состава коллекции, еще не учтенных в статистике'''
+    pending = await db.execute(
+        select(func.count())
+        .select_from(CollectionDocument)
+        .where(CollectionDocument.coll_id == collection_id, CollectionDocument.state != 'active')
+    )
+    return pending.scalar_one()
 
 async def get_collection_stat(
     db: AsyncSession,
     collection_id: str,
     offset: int = 0,
-    limit: int = 50
-    ) -> Sequence[CollectionStatistic]:
-    collection = await get_coll(db, collection_id)
-    if not collection:
-        return
-    stats = await db.execute(
-        select(CollectionStatistic)
+    limit: int = 50,
+    after_tf: float | None = None,
+    after_word: str | None = None
+    ) -> Sequence[Row]:
+    '''tf и idf считаются при чтении из count, word_doc_occurrences и счетчиков коллекции.
+    Порядок (count DESC, word) совпадает с порядком по tf и обслуживается индексом (coll_id, count DESC, word).
+    Курсор after_tf переводится обратно в count: tf = count / total_words'''
+    query = (
+        select(
+            CollectionStatistic.word,
+            func.coalesce(cast(CollectionStatistic.count, Float) / func.nullif(Collection.total_words, 0), 0.0).label('tf'),
+            func.log(cast(Collection.doc_count, Float) / CollectionStatistic.word_doc_occurrences).label('idf')
+        )
+        .join(Collection, Collection.id == CollectionStatistic.coll_id)
         .where(CollectionStatistic.coll_id == collection_id)
-        .order_by(desc(CollectionStatistic.tf))
+        .order_by(desc(CollectionStatistic.count), CollectionStatistic.word)
         .offset(offset)
         .limit(limit)
     )
-    return stats.scalars().all()
+    if after_tf is not None:
+        total_words = select(Collection.total_words).where(Collection.id == collection_id).scalar_subquery()
+        # round() возвращает float8; без приведения к integer столбец count сравнивался бы как float8
+        # и индекс (coll_id, count DESC, word) не использовался бы для перехода к началу страницы
+        after_count = cast(func.round(after_tf * total_words), Integer)
+        query = query.where(
+            CollectionStatistic.count <= after_count,
+            (CollectionStatistic.count < after_count) | (CollectionStatistic.word > after_word)
+        )
+    stats = await db.execute(query)
+    return stats.all()
         
+async def search_collection(db: AsyncSession, collection_id: str, query: str, limit: int = 10) -> list[tuple[Row, float]]:
+    '''Поиск документов коллекции по словам запроса, упорядоченных по сумме tf * idf слов запроса.
+    Для каждого слова читается только его список документов по индексу (word, doc_id), поэтому время
+    зависит от длины этих списков, а не от размера коллекции; idf - из статистики коллекции.
+    Из накопленных оценок limit лучших выбираются кучей. Возвращает (id, name) документа и оценку'''
+    words = set(split_text(query))
+    if not words:
+        return []
+    
+    idf = func.log(cast(Collection.doc_count, Float) / CollectionStatistic.word_doc_occurrences)
+    postings = await db.execute(
+        select(DocumentStatistic.doc_id, DocumentStatistic.tf * idf)
+        .join(
+            CollectionDocument,
+            (CollectionDocument.doc_id == DocumentStatistic.doc_id)
+            & (CollectionDocument.coll_id == collection_id)
+            & (CollectionDocument.state != 'pending_remove')
+        )
+        .join(
+            CollectionStatistic,
+            (CollectionStatistic.coll_id == CollectionDocument.coll_id)
+            & (CollectionStatistic.word == DocumentStatistic.word)
+        )
+        .join(Collection, Collection.id == CollectionStatistic.coll_id)
+        .where(DocumentStatistic.word.in_(words))
+    )
+    scores: defaultdict[UUID, float] = defaultdict(float)
+    for doc_id, score in postings:
+        scores[doc_id] += score
+    top = heapq.nlargest(limit, scores.items(), key=lambda item: (item[1], str(item[0])))
+    return await with_doc_names(db, top)
+    
+async def get_similar_docs(db: AsyncSession, collection_id: str, doc_id: UUID, limit: int = 10) -> list[tuple[Row, float]] | None:
+    '''limit документов коллекции, ближайших к doc_id по косинусу векторов tf * idf.
+    None, если документа нет в коллекции'''
+    index = await similarity_indexes.get(db, collection_id)
+    if doc_id not in index.rows:
+        return None
+    return await with_doc_names(db, index.similar(doc_id, limit))
+    
+async def with_doc_names(db: AsyncSession, scored: list[tuple[UUID, float]]) -> list[tuple[Row, float]]:
+    if not scored:
+        return []
+    docs = await db.execute(select(Document.id, Document.name).where(Document.id.in_([doc_id for doc_id, _ in scored])))
+    names = {doc.id: doc for doc in docs}
+    return [(names[doc_id], score) for doc_id, score in scored if doc_id in names]
+        
+@timed_stage('collection_statistics')
 async def update_collection_statistics(
     db: AsyncSession,
-    collection: Collection,
-    doc: Document,
+    collection_id: str,
+    doc_ids: Sequence[UUID],
     operation: bool = True
     ):
-    if not collection or not doc:
-        return
-
-    existing_stats = {stat.word: stat for stat in collection.statistics}
-    
-    doc_stats = {stat.word: stat for stat in doc.statistics}
-    doc_count = len(collection.documents)
-
-    to_delete = []
-
-    for word, doc_stat in doc_stats.items():
-        if word in existing_stats:
-            stat = existing_stats[word]
-
-            if operation:
-                stat.count += doc_stat.count
-                stat.word_doc_occurrences += 1
-            else:
-                stat.count -= doc_stat.count
-                stat.word_doc_occurrences -= 1
-
-                if stat.count <= 0 or stat.word_doc_occurrences <= 0:
-                    to_delete.append(stat)
-        else:
-            if operation:
-                new_stat = CollectionStatistic(
-                    coll_id=collection.id,
-                    word=word,
-                    count=doc_stat.count,
-                    tf=doc_stat.count / (collection.total_words or 1),
-                    word_doc_occurrences=1,
-                    idf=log10(doc_count)
-                )
-                db.add(new_stat)
-                
-    for word, stat in existing_stats.items():
-        stat.tf = stat.count / collection.total_words if collection.total_words > 0 else 0.0
-        stat.idf = log10(doc_count / stat.word_doc_occurrences) if stat.word_doc_occurrences > 0 else 0.0 
+    '''Слияние статистики документов со статистикой коллекции набором SQL-запросов,
+    без загрузки строк в Python. operation=True - документы добавлены, False - удалены.
+    Статистика документов сначала агрегируется по словам (сумма count и число документов со словом),
+    поэтому для любого числа документов выполняется одно слияние.
+    Затрагиваются только слова документов: tf и idf не хранятся, а считаются при чтении'''
+    doc_stats = (
+        select(
+            DocumentStatistic.word,
+            func.sum(DocumentStatistic.count).label('count'),
+            func.count().label('docs')
+        )
+        .where(DocumentStatistic.doc_id.in_(doc_ids))
+        .group_by(DocumentStatistic.word)
+        .subquery()
+    )
+    docs_length = select(func.coalesce(func.sum(Document.length), 0)).where(Document.id.in_(doc_ids)).scalar_subquery()
 
-    for stat in to_delete:
-        await db.delete(stat)
+    if operation:
+        merge = insert(CollectionStatistic).from_select(
+            ['coll_id', 'word', 'count', 'word_doc_occurrences'],
+            select(
+                literal(collection_id, CollectionStatistic.coll_id.type),
+                doc_stats.c.word,
+                doc_stats.c.count,
+                doc_stats.c.docs
+            )
+        )
+        await db.execute(
+            merge.on_conflict_do_update(
+                index_elements=[CollectionStatistic.coll_id, CollectionStatistic.word],
+                set_={
+                    'count': CollectionStatistic.count + merge.excluded.count,
+                    'word_doc_occurrences': CollectionStatistic.word_doc_occurrences + merge.excluded.word_doc_occurrences
+                }
+            )
+        )
+    else:
+        await db.execute(
+            update(CollectionStatistic)
+            .where(CollectionStatistic.coll_id == collection_id, CollectionStatistic.word == doc_stats.c.word)
+            .values(
+                count=CollectionStatistic.count - doc_stats.c.count,
+                word_doc_occurrences=CollectionStatistic.word_doc_occurrences - doc_stats.c.docs
+            )
+        )
+        await db.execute(
+            delete(CollectionStatistic)
+            .where(
+                CollectionStatistic.coll_id == collection_id,
+                CollectionStatistic.word.in_(select(doc_stats.c.word)),
+                (CollectionStatistic.count <= 0) | (CollectionStatistic.word_doc_occurrences <= 0)
+            )
+        )
 
-    await db.commit()
\ No newline at end of file
+    await db.execute(
+        update(Collection)
+        .where(Collection.id == collection_id)
+        .values(
+            total_words=Collection.total_words + (docs_length if operation else -docs_length),
+            doc_count=Collection.doc_count + (len(doc_ids) if operation else -len(doc_ids))
+        )
+    )
\ No newline at end of file
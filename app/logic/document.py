@@ -1,61 +1,163 @@
-from collections import Counter
 import time
+from collections import Counter
 from typing import Sequence
+from uuid import UUID
 
-from sqlalchemy import desc, select
-from sqlalchemy.orm import selectinload
+from sqlalchemy import delete, desc, insert, select, update
+from sqlalchemy.orm import load_only
+from sqlalchemy.orm.interfaces import ORMOption
 from sqlalchemy.ext.asyncio import AsyncSession
 
-from logic.huffman import encode, get_huffman_code
+from core.metrics import observe_stages, stage, timed_stage
+from infra.cache import stats_cache
+from infra.executor import analysis_pool
 from infra.models import Document, DocumentStatistic
-from logic.text_utils import get_text_length, split_text
+from logic.analysis import TextAnalysis, analyze_text
+from logic.batch import BatchFile
+from logic.collection import attach_docs_to_collection, collection_changed, detach_doc_from_collections
+from logic.huffman import encode, get_code_lengths
+from logic.metrics import record_docs
+
+STATISTICS_COPY_THRESHOLD = 1000
+STATISTICS_BATCH_SIZE = 10000
+LEGACY_HUFFMAN_BATCH_SIZE = 20
 
-async def create_doc(db: AsyncSession, user_id: str, doc_name: str, text_str: str) -> Document:
-    start_time = time.monotonic()
+async def create_doc(
+    db: AsyncSession,
+    user_id: str,
+    doc_name: str,
+    text_str: str,
+    analysis: TextAnalysis | None = None,
+    start_time: float | None = None
+    ) -> Document:
+    start_time = start_time or time.monotonic()
     
-    words_count = get_text_length(text_str)
-    huffman = encode(text_str, get_huffman_code(text_str))
+    if analysis is None:
+        analysis = await analysis_pool.run(analyze_text, text_str, size=len(text_str))
+    observe_stages(analysis.timings)
+    words_count = analysis.length
     
-    doc = Document(name=doc_name, text=text_str, length=words_count, author_id=user_id, huffman=huffman)
+    doc = Document(
+        name=doc_name,
+        text=text_str,
+        length=words_count,
+        author_id=user_id,
+        huffman=analysis.huffman.data,
+        huffman_codebook=analysis.huffman.code_lengths,
+        huffman_bit_length=analysis.huffman.bit_length
+    )
     
     db.add(doc)
-    await db.flush()
-    
-    words_list = split_text(text_str)
-    word_counts = Counter(words_list)
-    
-    statistics = []
-    for word, count in word_counts.items():
-        tf = count / words_count
-        stat = DocumentStatistic(
-            doc_id=doc.id,
-            word=word,
-            count=count,
-            tf=tf,
-        )
-        statistics.append(stat)
-
-    db.add_all(statistics)
+    with stage('flush'):
+        await db.flush()
+    
+    await insert_doc_statistics(db, doc.id, analysis.word_counts, words_count)
     
     end_time = time.monotonic()
     doc.process_time = round(end_time - start_time, 3)
     
-    await db.commit()
+    await record_docs(db, [(doc.length, doc.process_time)])
+    with stage('commit'):
+        await db.commit()
     return doc
     
-async def get_doc_by_id(db: AsyncSession, doc_id: str) -> Document:
+async def create_docs(
+    db: AsyncSession,
+    user_id: str,
+    files: Sequence[BatchFile],
+    collection_id: str | None = None
+    ) -> list[Document]:
+    '''Пакетное создание документов в одной транзакции: документы - одним INSERT ... RETURNING,
+    статистика всех документов - одной массовой вставкой, добавление в коллекцию - в том же коммите'''
+    docs = [
+        Document(
+            name=file.doc_name,
+            text=file.text,
+            length=file.analysis.length,
+            author_id=user_id,
+            huffman=file.analysis.huffman.data,
+            huffman_codebook=file.analysis.huffman.code_lengths,
+            huffman_bit_length=file.analysis.huffman.bit_length
+        )
+        for file in files
+    ]
+    for file in files:
+        observe_stages(file.analysis.timings)
+    db.add_all(docs)
+    with stage('flush'):
+        await db.flush()
+    
+    await insert_docs_statistics(
+        db,
+        [(doc.id, file.analysis.word_counts, file.analysis.length) for doc, file in zip(docs, files)]
+    )
+    if collection_id is not None:
+        await attach_docs_to_collection(db, collection_id, [doc.id for doc in docs])
+    
+    end_time = time.monotonic()
+    for doc, file in zip(docs, files):
+        doc.process_time = round(end_time - file.start_time, 3)
+    
+    await record_docs(db, [(doc.length, doc.process_time) for doc in docs])
+    with stage('commit'):
+        await db.commit()
+    if collection_id is not None:
+        await collection_changed(db, collection_id, added=[doc.id for doc in docs])
+    return docs
+    
+async def insert_doc_statistics(db: AsyncSession, doc_id: str, word_counts: dict[str, int], words_count: int):
+    await insert_docs_statistics(db, [(doc_id, word_counts, words_count)])
+    
+@timed_stage('statistics')
+async def insert_docs_statistics(db: AsyncSession, docs: Sequence[tuple[str, dict[str, int], int]]):
+    '''Массовая вставка статистики документов (doc_id, частоты слов, число слов) без ORM-объектов:
+    COPY через asyncpg для больших словарей, иначе executemany через Core insert'''
+    records = (
+        (doc_id, word, count, count / words_count)
+        for doc_id, word_counts, words_count in docs
+        for word, count in word_counts.items()
+    )
+    if sum(len(word_counts) for _, word_counts, _ in docs) >= STATISTICS_COPY_THRESHOLD and db.bind.dialect.driver == 'asyncpg':
+        connection = await db.connection()
+        raw_connection = await connection.get_raw_connection()
+        await raw_connection.driver_connection.copy_records_to_table(
+            DocumentStatistic.__tablename__,
+            records=records,
+            columns=('doc_id', 'word', 'count', 'tf')
+        )
+        return
+
+    rows = [
+        {'doc_id': doc_id, 'word': word, 'count': count, 'tf': tf}
+        for doc_id, word, count, tf in records
+    ]
+    for start in range(0, len(rows), STATISTICS_BATCH_SIZE):
+        await db.execute(insert(DocumentStatistic), rows[start:start + STATISTICS_BATCH_SIZE])
+    
+async def get_doc_by_id(db: AsyncSession, doc_id: str, *options: ORMOption) -> Document:
     doc = await db.execute(
         select(Document)
         .where(Document.id == doc_id)
-        .options(
-            selectinload(Document.collections),
-            selectinload(Document.statistics)
-            )
+        .options(*options)
         )
     return doc.scalar_one_or_none()
     
+async def get_doc_author(db: AsyncSession, doc_id: str) -> UUID | None:
+    '''Проверка существования и владельца документа одним запросом к одному столбцу'''
+    author_id = await db.execute(select(Document.author_id).where(Document.id == doc_id))
+    return author_id.scalar_one_or_none()
+    
+async def get_docs_authors(db: AsyncSession, doc_ids: Sequence[UUID]) -> dict[UUID, UUID]:
+    '''Владельцы существующих документов из списка: id документа -> author_id'''
+    authors = await db.execute(select(Document.id, Document.author_id).where(Document.id.in_(doc_ids)))
+    return dict(authors.tuples().all())
+    
 async def get_docs_by_user(db: AsyncSession, user_id: str) -> Sequence[Document]:
-    docs = await db.execute(select(Document).where(Document.author_id == user_id))
+    docs = await db.execute(
+        select(Document)
+        .where(Document.author_id == user_id)
+        .options(load_only(Document.id, Document.name))
+    )
     return docs.scalars().all()
 
 async def get_docs_by_collection(db: AsyncSession, collection_id: str) -> Sequence[Document]:
@@ -66,22 +168,71 @@ async def get_docs_by_collection(db: AsyncSession, collection_id: str) -> Sequen
     )
     return docs.scalars().all()
 
-async def delete_doc(db: AsyncSession, doc_id: str) -> Document:
-    doc = await get_doc_by_id(db, doc_id)
-    if doc:
-        await db.delete(doc)
-        await db.commit()
-    return doc
+async def delete_doc(db: AsyncSession, doc_id: str) -> bool:
+    '''Удаление документа одной транзакцией: документ вычитается из статистики всех коллекций,
+    затем удаляется строка документа, а его статистика и связи с коллекциями удаляются каскадом в БД'''
+    collection_ids = await detach_doc_from_collections(db, doc_id)
+    deleted = await db.execute(
+        delete(Document)
+        .where(Document.id == doc_id)
+        .returning(Document.length, Document.process_time)
+    )
+    deleted_doc = deleted.first()
+    if deleted_doc is None:
+        await db.rollback()
+        return False
+    await record_docs(db, [deleted_doc], -1)
+    await db.commit()
+    await stats_cache.bump_version('doc', doc_id)
+    for collection_id in collection_ids:
+        await collection_changed(db, collection_id, removed=[doc_id], background=False)
+    return True
     
-async def get_doc_stat(db: AsyncSession, doc_id: str, offset: int = 0, limit: int = 50) -> Sequence[DocumentStatistic]:
-    doc = await get_doc_by_id(db, doc_id)
-    if not doc:
-        return
-    stats = await db.execute(
+async def get_doc_stat(
+    db: AsyncSession,
+    doc_id: str,
+    offset: int = 0,
+    limit: int = 50,
+    after_tf: float | None = None,
+    after_word: str | None = None
+    ) -> Sequence[DocumentStatistic]:
+    '''Страница статистики в порядке (tf DESC, word). С курсором (after_tf, after_word)
+    чтение начинается сразу после него по индексу (doc_id, tf DESC, word), без пропуска offset строк'''
+    query = (
         select(DocumentStatistic)
         .where(DocumentStatistic.doc_id == doc_id)
-        .order_by(desc(DocumentStatistic.tf))
+        .order_by(desc(DocumentStatistic.tf), DocumentStatistic.word)
         .offset(offset)
         .limit(limit)
     )
-    return stats.scalars().all()
\ No newline at end of file
+    if after_tf is not None:
+        query = query.where(
+            DocumentStatistic.tf <= after_tf,
+            (DocumentStatistic.tf < after_tf) | (DocumentStatistic.word > after_word)
+        )
+    stats = await db.execute(query)
+    return stats.scalars().all()
+
+async def encode_legacy_huffman(db: AsyncSession, batch_size: int = LEGACY_HUFFMAN_BATCH_SIZE) -> int:
+    '''Кодирование Хаффмана документов, сохраненных до 1.3.0: при обновлении схемы их код очищается
+    (huffman_bit_length = 0 при непустом тексте). Документы обрабатываются пачками с коммитом после каждой.
+    Возвращает число перекодированных документов'''
+    encoded = 0
+    while True:
+        docs = await db.execute(
+            select(Document.id, Document.text)
+            .where(Document.huffman_bit_length == 0, Document.text != '')
+            .limit(batch_size)
+        )
+        docs = docs.all()
+        if not docs:
+            return encoded
+        for doc_id, text in docs:
+            huffman = encode(text, get_code_lengths(Counter(text)))
+            await db.execute(
+                update(Document)
+                .where(Document.id == doc_id)
+                .values(huffman=huffman.data, huffman_codebook=huffman.code_lengths, huffman_bit_length=huffman.bit_length)
+            )
+        await db.commit()
+        encoded += len(docs)
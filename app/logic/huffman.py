@@ -1,49 +1,197 @@
 from collections import Counter
-from dataclasses import dataclass, field
+from dataclasses import dataclass
+from functools import lru_cache
 import heapq
+from typing import Iterator, Mapping
 
-@dataclass(order=True)
-class Node:
-    count: int
-    char: str = field(default=None, compare=False)
-    code: str = field(default='', compare=False)
-    left: 'Node' = field(default=None, compare=False)
-    right: 'Node' = field(default=None, compare=False)
-       
-def build_tree(text: str) -> Node:
-    char_count = Counter(text)
-    node_list = [Node(char=char, count=count) for char, count in char_count.items()]
-    heapq.heapify(node_list)
-
-    while len(node_list) > 1:
-        right = heapq.heappop(node_list)
-        left = heapq.heappop(node_list)
-        node = Node(count=right.count+left.count, left=left, right=right)
-        right.code = '1'
-        left.code = '0'
-        heapq.heappush(node_list, node)
-
-    return node_list[0]
-
-def assign_codes(node: Node) -> dict[str, str]:
-    codebook = {}
-    node_list = [node]
-    while node_list:
-        node = node_list.pop()
-        if not node.char:
-            node.left.code = node.code + node.left.code
-            node.right.code = node.code + node.right.code
-            node_list.append(node.left)
-            node_list.append(node.right)
-        else:
-            codebook[node.char] = node.code
-    return codebook
+ENCODE_CHUNK_SIZE = 1 << 16
+DECODE_CHUNK_SIZE = 1 << 16
+DECODE_TABLE_BITS = 12
+
+_BYTE_BITS = [format(byte, '08b') for byte in range(256)]
+
+@dataclass
+class EncodedText:
+    data: bytes
+    bit_length: int
+    code_lengths: dict[str, int]
+
+@dataclass(frozen=True)
+class DecodeTable:
+    table_bits: int
+    max_length: int
+    entries: list[tuple[str | None, int]]
+    runs: list[tuple[str, int]]
+    symbols: list[str]
+    length_count: list[int]
+    first_code: list[int]
+    first_index: list[int]
+
+def get_code_lengths(char_count: Mapping[str, int]) -> dict[str, int]:
+    '''Длины кодов Хаффмана по частотам символов. Дерево хранится как массив родителей'''
+    symbols = list(char_count)
+    if len(symbols) <= 1:
+        return {char: 1 for char in symbols}
+
+    heap = [(count, index) for index, count in enumerate(char_count.values())]
+    heapq.heapify(heap)
+    parents = [0] * (2 * len(symbols) - 1)
+    next_id = len(symbols)
+    while len(heap) > 1:
+        right_count, right = heapq.heappop(heap)
+        left_count, left = heapq.heappop(heap)
+        parents[right] = parents[left] = next_id
+        heapq.heappush(heap, (right_count + left_count, next_id))
+        next_id += 1
+
+    depth = [0] * next_id
+    for node in range(next_id - 2, -1, -1):
+        depth[node] = depth[parents[node]] + 1
+    return {char: depth[index] for index, char in enumerate(symbols)}
+
+def get_canonical_codes(code_lengths: Mapping[str, int]) -> dict[str, tuple[int, int]]:
+    '''Канонические коды по длинам: символ -> (код, длина кода)'''
+    codes = {}
+    code = 0
+    prev_length = 0
+    for char, length in sorted(code_lengths.items(), key=lambda item: (item[1], item[0])):
+        code <<= length - prev_length
+        codes[char] = (code, length)
+        code += 1
+        prev_length = length
+    return codes
 
 def get_huffman_code(text: str) -> dict[str, str]:
-    if not text:
-        return {}
-    root = build_tree(text)
-    return assign_codes(root)
-    
-def encode(text: str, codebook: dict[str, str]) -> str:
-    return ''.join(codebook[char] for char in text)
\ No newline at end of file
+    codes = get_canonical_codes(get_code_lengths(Counter(text)))
+    return {char: format(code, f'0{length}b') for char, (code, length) in codes.items()}
+
+class HuffmanEncoder:
+    '''Потоковое кодирование: feed принимает текст частями, finish возвращает EncodedText.
+    Внутри части коды из таблицы (код, длина) склеиваются в строку битов и переводятся в int
+    одним вызовом; биты копятся в аккумуляторе (acc, acc_bits), целые байты сразу выгружаются'''
+
+    def __init__(self, code_lengths: Mapping[str, int]):
+        self.code_lengths = dict(code_lengths)
+        bit_table = {char: format(code, f'0{length}b') for char, (code, length) in get_canonical_codes(code_lengths).items()}
+        self._lookup = bit_table.__getitem__
+        self._packed = bytearray()
+        self._acc = self._acc_bits = 0
+
+    def feed(self, text: str) -> None:
+        lookup, packed = self._lookup, self._packed
+        acc, acc_bits = self._acc, self._acc_bits
+        for start in range(0, len(text), ENCODE_CHUNK_SIZE):
+            bits = ''.join(map(lookup, text[start:start + ENCODE_CHUNK_SIZE]))
+            acc = (acc << len(bits)) | int(bits or '0', 2)
+            acc_bits += len(bits)
+            rest = acc_bits & 7
+            packed += (acc >> rest).to_bytes(acc_bits >> 3, 'big')
+            acc &= (1 << rest) - 1
+            acc_bits = rest
+        self._acc, self._acc_bits = acc, acc_bits
+
+    def finish(self) -> EncodedText:
+        packed = self._packed
+        bit_length = len(packed) * 8 + self._acc_bits
+        if self._acc_bits:
+            packed.append(self._acc << (8 - self._acc_bits))
+        return EncodedText(data=bytes(packed), bit_length=bit_length, code_lengths=self.code_lengths)
+
+def encode(text: str, code_lengths: Mapping[str, int]) -> EncodedText:
+    encoder = HuffmanEncoder(code_lengths)
+    encoder.feed(text)
+    return encoder.finish()
+
+@lru_cache(maxsize=64)
+def _build_decode_table(code_lengths: tuple[tuple[str, int], ...]) -> DecodeTable:
+    max_length = max(length for _, length in code_lengths)
+    table_bits = min(max_length, DECODE_TABLE_BITS)
+    entries: list[tuple[str | None, int]] = [(None, 0)] * (1 << table_bits)
+    symbols = []
+    length_count = [0] * (max_length + 1)
+    for char, (code, length) in get_canonical_codes(dict(code_lengths)).items():
+        symbols.append(char)
+        length_count[length] += 1
+        if length <= table_bits:
+            shift = table_bits - length
+            start = code << shift
+            entries[start:start + (1 << shift)] = [(char, length)] * (1 << shift)
+
+    runs = []
+    for peek in range(1 << table_bits):
+        chars = []
+        used = 0
+        char, length = entries[peek]
+        while char is not None and used + length <= table_bits:
+            chars.append(char)
+            used += length
+            char, length = entries[(peek << used) & ((1 << table_bits) - 1)]
+        runs.append((''.join(chars), used))
+
+    first_code = [0] * (max_length + 1)
+    first_index = [0] * (max_length + 1)
+    code = index = 0
+    for length in range(1, max_length + 1):
+        code = (code + length_count[length - 1]) << 1 if length > 1 else 0
+        first_code[length] = code
+        first_index[length] = index
+        index += length_count[length]
+    return DecodeTable(table_bits, max_length, entries, runs, symbols, length_count, first_code, first_index)
+
+def decode(data: bytes, bit_length: int, code_lengths: Mapping[str, int]) -> Iterator[str]:
+    '''Потоковое декодирование по таблице на table_bits бит: выдает исходный текст частями.
+    Один просмотр таблицы runs декодирует все коды, целиком помещающиеся в table_bits бит.
+    Коды длиннее table_bits дочитываются побитно по каноническим first_code/first_index'''
+    if not bit_length:
+        return
+    table = _build_decode_table(tuple(sorted(code_lengths.items())))
+    table_bits, max_length, entries, runs = table.table_bits, table.max_length, table.entries, table.runs
+    table_mask = (1 << table_bits) - 1
+
+    chunk = []
+    buffer = buffer_bits = 0
+    position = 0
+    remaining = bit_length
+    while remaining > 0:
+        while buffer_bits < max_length and position < len(data):
+            refill = data[position:position + 8]
+            buffer = (buffer << (len(refill) * 8)) | int.from_bytes(refill, 'big')
+            buffer_bits += len(refill) * 8
+            position += len(refill)
+
+        if buffer_bits >= table_bits:
+            peek = (buffer >> (buffer_bits - table_bits)) & table_mask
+        else:
+            peek = (buffer << (table_bits - buffer_bits)) & table_mask
+        run, length = runs[peek]
+        if length and length <= remaining:
+            chunk.append(run)
+        else:
+            char, length = entries[peek]
+            if char is None:
+                code, length = peek, table_bits
+                while True:
+                    length += 1
+                    code = (code << 1) | ((buffer >> (buffer_bits - length)) & 1)
+                    offset = code - table.first_code[length]
+                    if offset < table.length_count[length]:
+                        char = table.symbols[table.first_index[length] + offset]
+                        break
+            chunk.append(char)
+
+        buffer_bits -= length
+        buffer &= (1 << buffer_bits) - 1
+        remaining -= length
+        if len(chunk) >= DECODE_CHUNK_SIZE:
+            yield ''.join(chunk)
+            chunk = []
+    if chunk:
+        yield ''.join(chunk)
+
+def iter_bits(data: bytes, bit_length: int, chunk_size: int = DECODE_CHUNK_SIZE) -> Iterator[str]:
+    '''Ленивое построение текстового представления кода ('0'/'1') из упакованных битов'''
+    byte_length = (bit_length + 7) // 8
+    for start in range(0, byte_length, chunk_size):
+        bits = ''.join(_BYTE_BITS[byte] for byte in data[start:start + chunk_size])
+        tail = bit_length - start * 8
+        yield bits[:tail] if tail < len(bits) else bits
\ No newline at end of file
@@ -0,0 +1,70 @@
+import asyncio
+import logging
+
+from sqlalchemy import select
+
+from core.config import COLLECTION_STATS_BACKGROUND
+from infra.cache import stats_cache
+from infra.database import session_local
+from infra.models import CollectionDocument
+from infra.pubsub import cancel_task
+from infra.queue import collection_stats_queue
+from logic.collection import apply_membership_changes
+from logic.similarity import similarity_indexes
+
+logger = logging.getLogger(__name__)
+
+RETRY_DELAY = 5
+
+class CollectionStatsWorker:
+    '''Фоновый пересчет статистики коллекций (COLLECTION_STATS_BACKGROUND=true).
+    Изменения состава коллекции записываются запросом сразу (pending_add/pending_remove), а воркер
+    применяет к статистике все накопленные изменения коллекции за один проход'''
+
+    def __init__(self, enabled: bool):
+        self.enabled = enabled
+        self.processing: str | None = None
+        self._task: asyncio.Task | None = None
+
+    async def process(self, collection_id: str) -> int:
+        async with session_local() as db:
+            applied = await apply_membership_changes(db, collection_id)
+            await db.commit()
+            if applied:
+                # Видимый состав коллекции не изменился, индекс похожих документов только переходит на новую версию
+                version = await stats_cache.bump_version('collection', collection_id)
+                await similarity_indexes.update(db, collection_id, version)
+        return applied
+
+    async def _requeue_pending(self):
+        '''После перезапуска очередь в памяти пуста: коллекции с неприменёнными изменениями ставятся заново'''
+        async with session_local() as db:
+            collection_ids = await db.execute(
+                select(CollectionDocument.coll_id).where(CollectionDocument.state != 'active').distinct()
+            )
+            for collection_id in collection_ids.scalars():
+                await collection_stats_queue.put(str(collection_id))
+
+    async def _run(self):
+        await self._requeue_pending()
+        while True:
+            collection_id = await collection_stats_queue.get()
+            self.processing = collection_id
+            try:
+                await self.process(collection_id)
+            except Exception:
+                logger.exception('Collection statistics rebuild failed for %s', collection_id)
+                await asyncio.sleep(RETRY_DELAY)
+                await collection_stats_queue.put(collection_id)
+            finally:
+                self.processing = None
+
+    def start(self):
+        if self.enabled and self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        await cancel_task(self._task)
+        self._task = None
+
+collection_stats_worker = CollectionStatsWorker(enabled=COLLECTION_STATS_BACKGROUND)
@@ -0,0 +1,115 @@
+from collections import Counter
+from typing import Iterable
+
+from sqlalchemy import Integer, case, cast, func, select, update
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from core.metrics import QuantileSketch
+from infra.models import Document, ProcessTimeBucket, ServiceCounters, User
+
+COUNTERS_ID = 1
+
+# Время обработки округляется до миллисекунд, меньшие значения считаются нулем
+process_time_sketch = QuantileSketch(alpha=0.01, min_value=0.001)
+
+async def init_metrics(db: AsyncSession):
+    '''Заполнение агрегатов по уже существующим данным, если строки счетчиков еще нет.
+    Выполняется в migrate.py; дальше агрегаты изменяются только record_docs/record_users'''
+    if await db.get(ServiceCounters, COUNTERS_ID) is not None:
+        return
+    
+    docs = await db.execute(
+        select(
+            func.count(Document.id),
+            func.coalesce(func.sum(Document.length), 0),
+            func.coalesce(func.sum(Document.process_time), 0.0),
+            func.count(Document.process_time)
+        )
+    )
+    docs_count, total_words, process_time_sum, process_time_count = docs.one()
+    users_count = (await db.execute(select(func.count(User.id)))).scalar_one()
+    db.add(ServiceCounters(
+        id=COUNTERS_ID,
+        users=users_count,
+        docs=docs_count,
+        total_words=total_words,
+        process_time_sum=process_time_sum,
+        process_time_count=process_time_count
+    ))
+    
+    # Та же формула корзины, что и в QuantileSketch.key
+    key = case(
+        (Document.process_time < process_time_sketch.min_value, process_time_sketch.zero_key),
+        else_=cast(func.ceil(func.ln(Document.process_time) / process_time_sketch.log_gamma), Integer)
+    )
+    await db.execute(
+        insert(ProcessTimeBucket).from_select(
+            ['key', 'count'],
+            select(key, func.count()).where(Document.process_time.is_not(None)).group_by(key)
+        )
+    )
+    await db.commit()
+
+async def record_docs(db: AsyncSession, docs: Iterable[tuple[int, float | None]], sign: int = 1):
+    '''Изменение агрегатов в транзакции вызывающего по (length, process_time) документов:
+    sign=1 - документы созданы, -1 - удалены. Строка счетчиков остается заблокированной до коммита,
+    поэтому функция вызывается непосредственно перед ним'''
+    count = words = time_count = 0
+    time_sum = 0.0
+    buckets: Counter[int] = Counter()
+    for length, process_time in docs:
+        count += 1
+        words += length or 0
+        if process_time is not None:
+            time_count += 1
+            time_sum += process_time
+            buckets[process_time_sketch.key(process_time)] += 1
+    if not count:
+        return
+    
+    await db.execute(
+        update(ServiceCounters)
+        .where(ServiceCounters.id == COUNTERS_ID)
+        .values(
+            docs=ServiceCounters.docs + sign * count,
+            total_words=ServiceCounters.total_words + sign * words,
+            process_time_sum=ServiceCounters.process_time_sum + sign * time_sum,
+            process_time_count=ServiceCounters.process_time_count + sign * time_count
+        )
+    )
+    if buckets:
+        merge = insert(ProcessTimeBucket).values([
+            {'key': key, 'count': sign * bucket_count}
+            for key, bucket_count in sorted(buckets.items())
+        ])
+        await db.execute(
+            merge.on_conflict_do_update(
+                index_elements=[ProcessTimeBucket.key],
+                set_={'count': ProcessTimeBucket.count + merge.excluded.count}
+            )
+        )
+
+async def record_users(db: AsyncSession, sign: int = 1):
+    await db.execute(
+        update(ServiceCounters)
+        .where(ServiceCounters.id == COUNTERS_ID)
+        .values(users=ServiceCounters.users + sign)
+    )
+
+async def record_user_deleted(db: AsyncSession, user_id: str):
+    '''Перед удалением пользователя вместе с его документами'''
+    docs = await db.execute(select(Document.length, Document.process_time).where(Document.author_id == user_id))
+    await record_docs(db, docs.all(), -1)
+    await record_users(db, -1)
+
+async def get_counters(db: AsyncSession) -> ServiceCounters | None:
+    counters = await db.execute(select(ServiceCounters).where(ServiceCounters.id == COUNTERS_ID))
+    return counters.scalar_one_or_none()
+
+async def get_process_time_sketch(db: AsyncSession) -> QuantileSketch:
+    buckets = await db.execute(select(ProcessTimeBucket.key, ProcessTimeBucket.count).where(ProcessTimeBucket.count > 0))
+    sketch = process_time_sketch.empty()
+    for key, count in buckets:
+        sketch.add_bucket(key, count)
+    return sketch
@@ -0,0 +1,159 @@
+import heapq
+import math
+from collections import OrderedDict, defaultdict
+from typing import Iterable, Sequence
+from uuid import UUID
+
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from core.config import SIMILARITY_INDEX_CACHE_SIZE
+from infra.cache import stats_cache
+from infra.models import CollectionDocument, DocumentStatistic
+
+class SimilarityIndex:
+    '''Разреженная матрица tf документов коллекции в двух представлениях: строки (слова документа)
+    и столбцы (документы со словом). idf = log10(N / df) считается по самому индексу, поэтому
+    добавление и удаление документа меняет только его строку и его столбцы. Нормы векторов tf * idf
+    зависят от N и всех df, поэтому после изменения пересчитываются один раз при следующем запросе'''
+
+    def __init__(self):
+        self.rows: dict[UUID, dict[str, float]] = {}
+        self.columns: defaultdict[str, dict[UUID, float]] = defaultdict(dict)
+        self._norms: dict[UUID, float] | None = None
+
+    def add(self, doc_id: UUID, terms: dict[str, float]):
+        if doc_id in self.rows:
+            return
+        self.rows[doc_id] = terms
+        for word, tf in terms.items():
+            self.columns[word][doc_id] = tf
+        self._norms = None
+
+    def remove(self, doc_id: UUID):
+        terms = self.rows.pop(doc_id, None)
+        if terms is None:
+            return
+        for word in terms:
+            column = self.columns[word]
+            del column[doc_id]
+            if not column:
+                del self.columns[word]
+        self._norms = None
+
+    def _idf(self, word: str) -> float:
+        return math.log10(len(self.rows) / len(self.columns[word]))
+
+    def _get_norms(self) -> dict[UUID, float]:
+        if self._norms is None:
+            idf = {word: self._idf(word) for word in self.columns}
+            self._norms = {
+                doc_id: math.sqrt(sum((tf * idf[word]) ** 2 for word, tf in terms.items()))
+                for doc_id, terms in self.rows.items()
+            }
+        return self._norms
+
+    def similar(self, doc_id: UUID, limit: int) -> list[tuple[UUID, float]]:
+        '''limit документов с наибольшим косинусом к документу doc_id. Произведение строки документа
+        на матрицу проходит только по столбцам его слов, то есть по документам с общими словами'''
+        terms = self.rows.get(doc_id)
+        if terms is None:
+            return []
+        norms = self._get_norms()
+        if not norms[doc_id]:
+            return []
+
+        scores: defaultdict[UUID, float] = defaultdict(float)
+        for word, tf in terms.items():
+            idf = self._idf(word)
+            if not idf:
+                continue
+            weight = tf * idf * idf
+            for other_id, other_tf in self.columns[word].items():
+                scores[other_id] += weight * other_tf
+        scores.pop(doc_id, None)
+
+        norm = norms[doc_id]
+        return heapq.nlargest(
+            limit,
+            ((other_id, score / (norm * norms[other_id])) for other_id, score in scores.items() if score > 0),
+            key=lambda item: (item[1], str(item[0]))
+        )
+
+def group_terms(rows: Iterable[tuple[UUID, str, float]]) -> dict[UUID, dict[str, float]]:
+    terms: defaultdict[UUID, dict[str, float]] = defaultdict(dict)
+    for doc_id, word, tf in rows:
+        terms[doc_id][word] = tf
+    return terms
+
+class SimilarityIndexCache:
+    '''LRU индексов коллекций в памяти процесса, привязанных к версии коллекции из кэша статистики.
+    Изменение состава коллекции в этом процессе переводит индекс на следующую версию, применяя
+    только добавленные и удаленные документы; если версию за это время увеличил другой процесс,
+    индекс отбрасывается и строится заново при следующем запросе'''
+
+    def __init__(self, size: int):
+        self.size = size
+        self._indexes: OrderedDict[str, tuple[int, SimilarityIndex]] = OrderedDict()
+
+    @property
+    def enabled(self) -> bool:
+        return self.size > 0 and stats_cache.enabled
+
+    async def build(self, db: AsyncSession, collection_id: str) -> SimilarityIndex:
+        '''Документы, видимые в коллекции: все, кроме ожидающих удаления (как и в составе коллекции)'''
+        rows = await db.execute(
+            select(DocumentStatistic.doc_id, DocumentStatistic.word, DocumentStatistic.tf)
+            .join(CollectionDocument, CollectionDocument.doc_id == DocumentStatistic.doc_id)
+            .where(CollectionDocument.coll_id == collection_id, CollectionDocument.state != 'pending_remove')
+        )
+        index = SimilarityIndex()
+        for doc_id, doc_terms in group_terms(rows).items():
+            index.add(doc_id, doc_terms)
+        return index
+
+    async def get(self, db: AsyncSession, collection_id: str) -> SimilarityIndex:
+        key = str(collection_id)
+        version = await stats_cache.get_version('collection', key) if self.enabled else None
+        if version is None:
+            return await self.build(db, collection_id)
+
+        cached = self._indexes.get(key)
+        if cached is not None and cached[0] == version:
+            self._indexes.move_to_end(key)
+            return cached[1]
+
+        index = await self.build(db, collection_id)
+        self._indexes[key] = (version, index)
+        self._indexes.move_to_end(key)
+        while len(self._indexes) > self.size:
+            self._indexes.popitem(last=False)
+        return index
+
+    async def update(
+        self,
+        db: AsyncSession,
+        collection_id: str,
+        version: int | None,
+        added: Sequence[UUID] = (),
+        removed: Sequence[UUID] = ()
+        ):
+        '''Вызывается после коммита и увеличения версии коллекции (version - новая версия)'''
+        key = str(collection_id)
+        cached = self._indexes.pop(key, None)
+        if cached is None or version is None or cached[0] != version - 1:
+            return
+        index = cached[1]
+        for doc_id in removed:
+            index.remove(doc_id)
+        new_ids = [doc_id for doc_id in added if doc_id not in index.rows]
+        if new_ids:
+            rows = await db.execute(
+                select(DocumentStatistic.doc_id, DocumentStatistic.word, DocumentStatistic.tf)
+                .where(DocumentStatistic.doc_id.in_(new_ids))
+            )
+            for doc_id, terms in group_terms(rows).items():
+                index.add(doc_id, terms)
+        self._indexes[key] = (version, index)
+
+similarity_indexes = SimilarityIndexCache(SIMILARITY_INDEX_CACHE_SIZE)
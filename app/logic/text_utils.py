@@ -1,9 +1,50 @@
 import re
+from collections import Counter
+
+WORD_PATTERN = re.compile(r'\b\w+\b', re.UNICODE)
+# Слово в самом конце строки. \Z, а не $: $ совпадает и перед завершающим \n.
+# Ретроспектива (?<!\w) начинает проверку только с начала слова, поэтому поиск линейный
+TRAILING_WORD_PATTERN = re.compile(r'(?<!\w)\w+\Z', re.UNICODE)
 
 def get_text_length(text: str):
-    text_words = re.findall(r'\b\w+\b', text, re.UNICODE)
+    text_words = WORD_PATTERN.findall(text)
     return len(text_words)
 
 def split_text(text: str):
-    text_words = re.findall(r'\b\w+\b', text.lower(), re.UNICODE)
-    return text_words
\ No newline at end of file
+    text_words = WORD_PATTERN.findall(text.lower())
+    return text_words
+
+def count_words(text: str) -> tuple[int, Counter[str]]:
+    '''Один проход по тексту: слова приводятся к нижнему регистру по одному,
+    без копии текста и промежуточного списка. Возвращает число слов и частоты'''
+    word_counts = Counter(map(str.lower, map(re.Match.group, WORD_PATTERN.finditer(text))))
+    return word_counts.total(), word_counts
+
+class WordCounter:
+    '''Потоковый подсчет слов по частям текста. Слово на конце части может продолжиться
+    в следующей, поэтому оно откладывается до следующего вызова feed или до close.
+    Отложенное слово хранится списком частей и склеивается один раз, когда слово закончится,
+    поэтому длинная последовательность без разделителей обрабатывается за линейное время'''
+
+    def __init__(self):
+        self.word_counts: Counter[str] = Counter()
+        self._tail: list[str] = []
+
+    def feed(self, chunk: str):
+        if not chunk:
+            return
+        tail = TRAILING_WORD_PATTERN.search(chunk)
+        if tail and tail.start() == 0:
+            # В части нет разделителей: она целиком продолжает отложенное слово
+            self._tail.append(chunk)
+            return
+        end = tail.start() if tail else len(chunk)
+        text = ''.join(self._tail) + chunk[:end] if self._tail else chunk[:end]
+        self._tail = [tail.group()] if tail else []
+        self.word_counts.update(map(str.lower, map(re.Match.group, WORD_PATTERN.finditer(text))))
+
+    def close(self) -> tuple[int, Counter[str]]:
+        if self._tail:
+            self.word_counts[''.join(self._tail).lower()] += 1
+            self._tail = []
+        return self.word_counts.total(), self.word_counts
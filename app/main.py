@@ -1,16 +1,38 @@
-from fastapi import FastAPI
+from fastapi import FastAPI, Request
 from contextlib import asynccontextmanager
+from time import perf_counter
 
 from api.document import router as document_router
 from api.collection import router as collection_router
 from api.user import router as auth_router
 from api.info import router as info_router
-from infra.database import init_db
+from auth.blacklist import blacklist_filter, redis_client
+from auth.cache import auth_cache
+from core.config import DB_QUERY_COUNT_HEADER
+from infra.cache import stats_cache
+from infra.database import query_counter
+from infra.executor import analysis_pool, password_pool
+from infra.warmup import warmup
+from logic.jobs import collection_stats_worker
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
-    await init_db()
+    # Таблицы создаются отдельным шагом migrate.py, чтобы несколько воркеров не выполняли DDL одновременно
+    started_at = perf_counter()
+    analysis_pool.start()
+    password_pool.start()
+    auth_cache.start(redis_client)
+    stats_cache.start()
+    blacklist_filter.start()
+    collection_stats_worker.start()
+    await warmup(started_at)
     yield
+    await collection_stats_worker.stop()
+    await blacklist_filter.stop()
+    await stats_cache.stop()
+    await auth_cache.stop()
+    password_pool.shutdown()
+    analysis_pool.shutdown()
 
 
 app = FastAPI(
@@ -20,4 +42,16 @@ app = FastAPI(
 app.include_router(document_router)
 app.include_router(collection_router)
 app.include_router(auth_router)
-app.include_router(info_router)
\ No newline at end of file
+app.include_router(info_router)
+
+if DB_QUERY_COUNT_HEADER:
+    @app.middleware('http')
+    async def add_query_count_header(request: Request, call_next):
+        counter = [0]
+        token = query_counter.set(counter)
+        try:
+            response = await call_next(request)
+        finally:
+            query_counter.reset(token)
+        response.headers['X-DB-Query-Count'] = str(counter[0])
+        return response
\ No newline at end of file
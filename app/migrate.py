@@ -0,0 +1,20 @@
+'''Создание и обновление таблиц БД, перекодирование Хаффмана документов прежних версий
+и начальное заполнение агрегатов метрик. Выполняется один раз перед запуском воркеров приложения:
+
+    python migrate.py
+'''
+import asyncio
+
+from infra.database import engine, init_db, session_local
+from logic.document import encode_legacy_huffman
+from logic.metrics import init_metrics
+
+async def main():
+    await init_db()
+    async with session_local() as db:
+        await encode_legacy_huffman(db)
+        await init_metrics(db)
+    await engine.dispose()
+
+if __name__ == '__main__':
+    asyncio.run(main())
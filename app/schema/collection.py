@@ -1,6 +1,7 @@
 from uuid import UUID
-from pydantic import BaseModel
+from pydantic import BaseModel, Field
 
+from core.config import COLLECTION_BULK_MAX_DOCS
 from schema.document import Doc
 
 class CollectCreate(BaseModel):
@@ -13,6 +14,22 @@ class Collect(CollectCreate):
 class CollectContent(Collect):
     documents: list[Doc]
 
+class CollectDocuments(BaseModel):
+    doc_ids: list[UUID] = Field(..., min_length=1, max_length=COLLECTION_BULK_MAX_DOCS)
+
+class SearchHit(Doc):
+    score: float
+
+class CollectionSearch(BaseModel):
+    id: UUID
+    query: str
+    results: list[SearchHit]
+
+class SimilarDocuments(BaseModel):
+    id: UUID
+    collection_id: UUID
+    results: list[SearchHit]
+
 class WordStat(BaseModel):
     word: str
     tf: float
@@ -20,4 +37,9 @@ class WordStat(BaseModel):
     
 class CollectionStat(BaseModel):
     id: UUID
-    stats: list[WordStat]
\ No newline at end of file
+    stats: list[WordStat]
+    next_after_tf: float | None = None
+    next_after_word: str | None = None
+    # Фоновый пересчет: есть изменения состава коллекции, еще не учтенные в статистике
+    stale: bool = False
+    pending_documents: int = 0
\ No newline at end of file
@@ -14,4 +14,18 @@ class WordDocStat(BaseModel):
 
 class DocStat(BaseModel):
     id: UUID
-    stats: list[WordDocStat]
\ No newline at end of file
+    stats: list[WordDocStat]
+    next_after_tf: float | None = None
+    next_after_word: str | None = None
+
+class BatchFileResult(BaseModel):
+    filename: str
+    id: UUID | None = None
+    doc_name: str | None = None
+    error: str | None = None
+
+class BatchUpload(BaseModel):
+    created: int
+    failed: int
+    collection_id: UUID | None = None
+    results: list[BatchFileResult]
\ No newline at end of file
@@ -1,4 +1,8 @@
+from typing import Literal
 from pydantic import BaseModel
 
 class Huffman(BaseModel):
-    encoded_content: str | None
\ No newline at end of file
+    encoded_content: str | None
+    encoding: Literal['bits', 'base64'] = 'bits'
+    bit_length: int = 0
+    codebook: dict[str, int] = {}
\ No newline at end of file
@@ -7,11 +7,35 @@ class Version(BaseModel):
 class Status(BaseModel):
     status: str = Field(..., example='OK')
     
+class CacheStats(BaseModel):
+    local_hits: int
+    redis_hits: int
+    misses: int
+    hit_ratio: float
+    
+class PasswordHashStats(BaseModel):
+    workers: int
+    in_progress: int
+    operations: int
+    avg_queue_ms: float
+    max_queue_ms: float
+    
+class DatabasePoolStats(BaseModel):
+    size: int
+    checked_out: int
+    overflow: int
+    checkouts: int
+    avg_checkout_ms: float
+    max_checkout_ms: float
+    
 class Metrics(BaseModel):
     files_processed: int
     min_time_processed: float
     max_time_processed: float
     avg_time_processed: float
+    p50_time_processed: float = 0.0
+    p95_time_processed: float = 0.0
+    p99_time_processed: float = 0.0
     latest_file_processed_timestamp: float = Field(..., example=1487477343.548853)
     avg_words_per_file: int
     avg_files_per_user: int
\ No newline at end of file
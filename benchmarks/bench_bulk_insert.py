@@ -0,0 +1,72 @@
+'''Скорость записи DocumentStatistic (строк/с): ORM add_all, Core executemany и COPY.
+Нужна PostgreSQL-база из .env (POSTGRES_*), таблицы создаются при необходимости.
+
+    python benchmarks/bench_bulk_insert.py --rows 10000 100000 1000000
+'''
+import argparse
+import asyncio
+import time
+
+from corpus import report
+from infra.base import Base
+from infra.database import engine, session_local
+from infra.models import Document, DocumentStatistic, User
+import logic.document as document_logic
+
+async def orm_add_all(db, doc_id, word_counts, words_count):
+    db.add_all(
+        DocumentStatistic(doc_id=doc_id, word=word, count=count, tf=count / words_count)
+        for word, count in word_counts.items()
+    )
+    await db.flush()
+
+async def core_executemany(db, doc_id, word_counts, words_count):
+    threshold = document_logic.STATISTICS_COPY_THRESHOLD
+    document_logic.STATISTICS_COPY_THRESHOLD = float('inf')
+    try:
+        await document_logic.insert_doc_statistics(db, doc_id, word_counts, words_count)
+    finally:
+        document_logic.STATISTICS_COPY_THRESHOLD = threshold
+
+async def copy_records(db, doc_id, word_counts, words_count):
+    await document_logic.insert_doc_statistics(db, doc_id, word_counts, words_count)
+
+async def measure(method, rows: int) -> float:
+    word_counts = {f'word{index}': index % 7 + 1 for index in range(rows)}
+    words_count = sum(word_counts.values())
+    async with session_local() as db:
+        user = User(username=f'bench-{time.monotonic_ns()}', password='-')
+        db.add(user)
+        await db.flush()
+        doc = Document(name='bench', text='', huffman=b'', author_id=user.id, length=words_count)
+        db.add(doc)
+        await db.flush()
+
+        start = time.perf_counter()
+        await method(db, doc.id, word_counts, words_count)
+        await db.flush()
+        elapsed = time.perf_counter() - start
+        await db.rollback()
+    return rows / elapsed
+
+async def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--rows', type=int, nargs='+', default=[10_000, 100_000, 1_000_000])
+    args = parser.parse_args()
+
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+
+    rows = []
+    for count in args.rows:
+        rows.append((
+            count,
+            f'{await measure(orm_add_all, count):,.0f}',
+            f'{await measure(core_executemany, count):,.0f}',
+            f'{await measure(copy_records, count):,.0f}',
+        ))
+    report(rows, ('distinct words', 'ORM add_all rows/s', 'executemany rows/s', 'COPY rows/s'))
+    await engine.dispose()
+
+if __name__ == '__main__':
+    asyncio.run(main())
\ No newline at end of file
@@ -0,0 +1,109 @@
+'''Сравнение канонического табличного кодирования Хаффмана с прежней реализацией
+(дерево из dataclass Node + строка из 0/1) и с побитовой записью в bytearray по таблице
+(код, длина). Колонки "writer"/"encode only" меряют только упаковку при готовых длинах кодов.
+
+    python benchmarks/bench_huffman.py --sizes 1 4 16
+'''
+import argparse
+import heapq
+import time
+from collections import Counter
+from dataclasses import dataclass, field
+
+from corpus import corpora, report
+from logic.huffman import decode, encode, get_canonical_codes, get_code_lengths
+
+@dataclass(order=True)
+class LegacyNode:
+    count: int
+    char: str = field(default=None, compare=False)
+    code: str = field(default='', compare=False)
+    left: 'LegacyNode' = field(default=None, compare=False)
+    right: 'LegacyNode' = field(default=None, compare=False)
+
+def legacy_build_tree(text: str) -> LegacyNode:
+    node_list = [LegacyNode(char=char, count=count) for char, count in Counter(text).items()]
+    heapq.heapify(node_list)
+    while len(node_list) > 1:
+        right = heapq.heappop(node_list)
+        left = heapq.heappop(node_list)
+        node = LegacyNode(count=right.count + left.count, left=left, right=right)
+        right.code = '1'
+        left.code = '0'
+        heapq.heappush(node_list, node)
+    return node_list[0]
+
+def legacy_assign_codes(node: LegacyNode) -> dict[str, str]:
+    codebook = {}
+    node_list = [node]
+    while node_list:
+        node = node_list.pop()
+        if not node.char:
+            node.left.code = node.code + node.left.code
+            node.right.code = node.code + node.right.code
+            node_list.append(node.left)
+            node_list.append(node.right)
+        else:
+            codebook[node.char] = node.code
+    return codebook
+
+def legacy_encode(text: str) -> str:
+    codebook = legacy_assign_codes(legacy_build_tree(text))
+    return ''.join(codebook[char] for char in text)
+
+def int_table_encode(text: str, code_lengths: dict[str, int]) -> tuple[bytes, int]:
+    '''Запись кодов из таблицы (код, длина) в аккумулятор, выгрузка целых байтов по 1024 бита'''
+    table = get_canonical_codes(code_lengths)
+    packed = bytearray()
+    acc = acc_bits = bit_length = 0
+    for code, length in map(table.__getitem__, text):
+        acc = acc << length | code
+        acc_bits += length
+        if acc_bits >= 1024:
+            rest = acc_bits & 7
+            packed += (acc >> rest).to_bytes(acc_bits >> 3, 'big')
+            bit_length += acc_bits - rest
+            acc &= (1 << rest) - 1
+            acc_bits = rest
+    bit_length += acc_bits
+    packed += (acc << (-acc_bits & 7)).to_bytes((acc_bits + 7) >> 3, 'big')
+    return bytes(packed), bit_length
+
+def canonical_encode(text: str):
+    return encode(text, get_code_lengths(Counter(text)))
+
+def measure(func, *args) -> tuple[float, object]:
+    start = time.perf_counter()
+    result = func(*args)
+    return time.perf_counter() - start, result
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--sizes', type=float, nargs='+', default=[1, 4, 16], help='corpus sizes, MB')
+    args = parser.parse_args()
+
+    rows = []
+    for name, text in corpora(args.sizes):
+        size_mb = len(text.encode('utf-8')) / 1024 / 1024
+        legacy_time, legacy_bits = measure(legacy_encode, text)
+        encode_time, encoded = measure(canonical_encode, text)
+        writer_time, (writer_data, _) = measure(int_table_encode, text, encoded.code_lengths)
+        encode_only_time, _ = measure(encode, text, encoded.code_lengths)
+        assert writer_data == encoded.data
+        decode_time, decoded = measure(lambda: ''.join(decode(encoded.data, encoded.bit_length, encoded.code_lengths)))
+        assert decoded == text
+        assert len(legacy_bits) == encoded.bit_length
+        rows.append((
+            name,
+            f'{size_mb / legacy_time:.1f}',
+            f'{size_mb / encode_time:.1f}',
+            f'{size_mb / writer_time:.1f}',
+            f'{size_mb / encode_only_time:.1f}',
+            f'{size_mb / decode_time:.1f}',
+            f'{len(legacy_bits) / 1024 / 1024:.1f}',
+            f'{len(encoded.data) / 1024 / 1024:.2f}',
+        ))
+    report(rows, ('corpus', 'legacy MB/s', 'encode MB/s', 'writer MB/s', 'encode only MB/s', 'decode MB/s', 'legacy size MB', 'packed size MB'))
+
+if __name__ == '__main__':
+    main()
\ No newline at end of file
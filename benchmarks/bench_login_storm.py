@@ -0,0 +1,87 @@
+'''Задержка /api/info/status во время волны логинов: bcrypt в event loop против пула потоков.
+Нужны PostgreSQL и Redis из .env (POSTGRES_*, REDIS_*), запросы идут в приложение в этом же процессе.
+
+    python benchmarks/bench_login_storm.py --logins 200 --concurrency 50
+'''
+import argparse
+import asyncio
+import statistics
+import time
+import uuid
+
+import httpx
+
+from corpus import report
+from infra.base import Base
+from infra.database import engine
+from infra.executor import password_pool
+from main import app
+
+PROBE_INTERVAL = 0.01
+
+async def probe(client: httpx.AsyncClient, stop: asyncio.Event) -> list[float]:
+    '''Запросы по фиксированному расписанию: задержка считается от запланированного времени,
+    поэтому время, когда event loop был занят и запрос не мог уйти, тоже учитывается'''
+    latencies = []
+    scheduled = time.perf_counter()
+    while not stop.is_set():
+        await client.get('/api/info/status')
+        latencies.append(time.perf_counter() - scheduled)
+        scheduled = max(scheduled + PROBE_INTERVAL, time.perf_counter())
+        await asyncio.sleep(scheduled - time.perf_counter())
+    return latencies
+
+async def storm(client: httpx.AsyncClient, username: str, logins: int, concurrency: int):
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def login():
+        async with semaphore:
+            response = await client.post('/api/auth/login', data={'username': username, 'password': 'password'})
+            response.raise_for_status()
+
+    await asyncio.gather(*(login() for _ in range(logins)))
+
+async def measure(client: httpx.AsyncClient, username: str, logins: int, concurrency: int) -> tuple:
+    stop = asyncio.Event()
+    probe_task = asyncio.create_task(probe(client, stop))
+    start = time.perf_counter()
+    await storm(client, username, logins, concurrency)
+    elapsed = time.perf_counter() - start
+    stop.set()
+    latencies = await probe_task
+    quantiles = statistics.quantiles(latencies, n=100, method='inclusive')
+    return (
+        f'{quantiles[49] * 1000:.1f}',
+        f'{quantiles[98] * 1000:.1f}',
+        f'{max(latencies) * 1000:.1f}',
+        f'{logins / elapsed:.1f}'
+    )
+
+async def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--logins', type=int, default=200)
+    parser.add_argument('--concurrency', type=int, default=50)
+    args = parser.parse_args()
+
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+
+    rows = []
+    async with app.router.lifespan_context(app):
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url='http://bench', timeout=600) as client:
+            username = f'bench-{uuid.uuid4().hex[:8]}'
+            response = await client.post('/api/auth/register', json={'username': username, 'password': 'password'})
+            response.raise_for_status()
+
+            workers = password_pool.workers
+            password_pool.shutdown()
+            rows.append(('event loop', *await measure(client, username, args.logins, args.concurrency)))
+            password_pool.workers = workers
+            password_pool.start()
+            rows.append((f'thread pool ({workers})', *await measure(client, username, args.logins, args.concurrency)))
+    report(rows, ('bcrypt', 'status p50 ms', 'status p99 ms', 'status max ms', 'logins/s'))
+    await engine.dispose()
+
+if __name__ == '__main__':
+    asyncio.run(main())
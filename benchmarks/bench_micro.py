@@ -0,0 +1,113 @@
+'''Микробенчмарки горячих функций: split_text, count_words, построение дерева Хаффмана
+(get_code_lengths), encode, decode и, с --db, update_collection_statistics (добавление и удаление
+документов в одной транзакции, которая затем откатывается). Для каждой функции берется лучшее
+время из --repeat запусков; --save/--compare сохраняют результаты и показывают изменение.
+
+    python benchmarks/bench_micro.py --sizes 1 8 --save micro.json
+    python benchmarks/bench_micro.py --sizes 1 8 --db --compare micro.json
+'''
+import argparse
+import asyncio
+import time
+from collections import Counter
+
+from corpus import corpora, make_text, report
+from harness import change, load_results, save_results
+from logic.huffman import decode, encode, get_code_lengths
+from logic.text_utils import count_words, split_text
+
+def best_time(func, repeat: int) -> float:
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+def text_benchmarks(sizes_mb: list[float], repeat: int) -> dict[str, float]:
+    '''Результат - МБ/с по каждой функции и корпусу'''
+    results = {}
+    for name, text in corpora(sizes_mb):
+        size_mb = len(text.encode('utf-8')) / 1024 / 1024
+        char_count = Counter(text)
+        code_lengths = get_code_lengths(char_count)
+        encoded = encode(text, code_lengths)
+        functions = {
+            'split_text': lambda: sum(1 for _ in split_text(text)),
+            'count_words': lambda: count_words(text),
+            'build_tree': lambda: get_code_lengths(Counter(text)),
+            'encode': lambda: encode(text, code_lengths),
+            'decode': lambda: ''.join(decode(encoded.data, encoded.bit_length, encoded.code_lengths)),
+        }
+        for function, call in functions.items():
+            results[f'{function} {name} MB/s'] = size_mb / best_time(call, repeat)
+    return results
+
+async def collection_benchmarks(doc_counts: list[int], doc_size_kb: int, repeat: int) -> dict[str, float]:
+    '''Результат - документов/с при добавлении и удалении doc_count документов из коллекции'''
+    from infra.database import engine, init_db, session_local
+    from infra.models import Collection, Document, User
+    from logic.collection import update_collection_statistics
+    from logic.document import insert_docs_statistics
+
+    await init_db()
+    results = {}
+    for doc_count in doc_counts:
+        add_times, remove_times = [], []
+        for attempt in range(repeat):
+            async with session_local() as db:
+                user = User(username=f'bench-{time.monotonic_ns()}', password='-')
+                db.add(user)
+                await db.flush()
+                docs = []
+                for index in range(doc_count):
+                    length, word_counts = count_words(make_text(doc_size_kb * 1024, seed=attempt * doc_count + index))
+                    doc = Document(name=f'bench-{index}', text='', huffman=b'', author_id=user.id, length=length)
+                    db.add(doc)
+                    docs.append((doc, word_counts, length))
+                collection = Collection(name='bench', author_id=user.id)
+                db.add(collection)
+                await db.flush()
+                await insert_docs_statistics(db, [(doc.id, word_counts, length) for doc, word_counts, length in docs])
+                doc_ids = [doc.id for doc, _, _ in docs]
+
+                start = time.perf_counter()
+                await update_collection_statistics(db, collection.id, doc_ids, True)
+                add_times.append(time.perf_counter() - start)
+                start = time.perf_counter()
+                await update_collection_statistics(db, collection.id, doc_ids, False)
+                remove_times.append(time.perf_counter() - start)
+                await db.rollback()
+        results[f'collection add {doc_count} docs/s'] = doc_count / min(add_times)
+        results[f'collection remove {doc_count} docs/s'] = doc_count / min(remove_times)
+    await engine.dispose()
+    return results
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--sizes', type=float, nargs='+', default=[1, 8], help='corpus sizes, MB')
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--db', action='store_true', help='also measure update_collection_statistics (needs POSTGRES_*)')
+    parser.add_argument('--docs', type=int, nargs='+', default=[1, 10, 100], help='documents per collection update')
+    parser.add_argument('--doc-size', type=int, default=16, help='document size for --db, KB')
+    parser.add_argument('--save', help='write results to a JSON file')
+    parser.add_argument('--compare', help='compare with results saved by --save')
+    args = parser.parse_args()
+
+    baseline = load_results(args.compare)
+    results = text_benchmarks(args.sizes, args.repeat)
+    if args.db:
+        results.update(asyncio.run(collection_benchmarks(args.docs, args.doc_size, args.repeat)))
+
+    # Изменение считается по времени на единицу работы: +N% - медленнее, как в bench_replay.py
+    rows = [
+        (name, f'{value:,.1f}', change(1 / value, 1 / baseline[name]) if name in baseline else '-')
+        for name, value in results.items()
+    ]
+    report(rows, ('benchmark', 'throughput', 'vs saved'))
+
+    if args.save:
+        save_results(args.save, results)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,206 @@
+'''Сквозной бенчмарк: воспроизведение смешанной нагрузки на приложение (загрузки, страницы статистики,
+добавление/удаление документов в коллекциях, Хаффман, логин, поиск) с пропускной способностью
+и p50/p99 задержки по каждому виду запроса. План запросов генерируется по --seed, поэтому
+прогоны с одинаковыми параметрами воспроизводят одну и ту же последовательность операций.
+Операции выполняются параллельно, поэтому similar изредка получает 404 для документа,
+который в этот момент удаляется из коллекции другой операцией.
+Нужна PostgreSQL-база из .env (POSTGRES_*); Redis из .env или --fakeredis.
+
+    python benchmarks/bench_replay.py --operations 2000 --concurrency 32 --fakeredis
+    python benchmarks/bench_replay.py --sizes 1 1024 51200 --save replay.json      # документы от 1 KB до 50 MB
+    python benchmarks/bench_replay.py --compare replay.json
+'''
+import argparse
+import asyncio
+import random
+import time
+import uuid
+from dataclasses import dataclass, field
+
+import httpx
+
+from corpus import CYRILLIC, LATIN, make_text, report
+from harness import app_client, change, load_results, percentile, save_results, use_fakeredis
+
+# Вид запроса -> вес в смешанной нагрузке
+WORKLOAD = {
+    'upload': 8,
+    'doc_stats': 20,
+    'collection_stats': 15,
+    'collection_add': 8,
+    'collection_remove': 6,
+    'huffman': 8,
+    'login': 4,
+    'search': 10,
+    'similar': 6,
+    'metrics': 5,
+}
+
+PASSWORD = 'password'
+MIN_MEMBERS = 2
+
+@dataclass
+class BenchUser:
+    username: str
+    headers: dict[str, str]
+    doc_ids: list[str] = field(default_factory=list)
+    collections: dict[str, set[str]] = field(default_factory=dict)
+
+def make_texts(sizes_kb: list[float], variants: int, seed: int) -> list[tuple[str, str]]:
+    '''Тексты для загрузок: каждый размер на латинице и кириллице в нескольких вариантах'''
+    return [
+        (f'{name}-{size_kb:g}kb-{variant}', make_text(int(size_kb * 1024), alphabet, seed=seed + variant))
+        for size_kb in sizes_kb
+        for name, alphabet in (('latin', LATIN), ('cyrillic', CYRILLIC))
+        for variant in range(variants)
+    ]
+
+async def create_user(client: httpx.AsyncClient, texts: list[tuple[str, str]], initial_docs: int, rng: random.Random) -> BenchUser:
+    username = f'bench-{uuid.uuid4().hex[:8]}'
+    response = await client.post('/api/auth/register', json={'username': username, 'password': PASSWORD})
+    response.raise_for_status()
+    response = await client.post('/api/auth/login', data={'username': username, 'password': PASSWORD})
+    response.raise_for_status()
+    user = BenchUser(username, {'Authorization': f'Bearer {response.json()["access_token"]}'})
+
+    files = [('files', (f'{name}.txt', text.encode())) for name, text in rng.choices(texts, k=initial_docs)]
+    response = await client.post('/api/documents/batch', files=files, headers=user.headers)
+    response.raise_for_status()
+    user.doc_ids = [result['id'] for result in response.json()['results'] if result['id']]
+
+    for index in range(2):
+        response = await client.post('/api/collections/', json={'name': f'bench-{index}'}, headers=user.headers)
+        response.raise_for_status()
+        doc_ids = rng.sample(user.doc_ids, len(user.doc_ids) // 2)
+        await client.post(f'/api/collections/{response.json()["id"]}/documents', json={'doc_ids': doc_ids}, headers=user.headers)
+        user.collections[response.json()['id']] = set(doc_ids)
+    return user
+
+async def run_operation(
+    client: httpx.AsyncClient,
+    operation: str,
+    user: BenchUser,
+    texts: list[tuple[str, str]],
+    rng: random.Random
+    ) -> httpx.Response:
+    '''Аргументы операции выбираются из текущего состояния пользователя'''
+    collection_id = rng.choice(list(user.collections))
+    members = user.collections[collection_id]
+    if operation == 'upload':
+        name, text = rng.choice(texts)
+        response = await client.post('/api/documents/', files={'file': (f'{name}.txt', text.encode())}, headers=user.headers)
+        if response.status_code == 200:
+            user.doc_ids.append(response.json()['id'])
+        return response
+    if operation == 'doc_stats':
+        params = {'offset': rng.choice((0, 0, 50, 200)), 'limit': 50}
+        return await client.get(f'/api/documents/{rng.choice(user.doc_ids)}/statistics', params=params, headers=user.headers)
+    if operation == 'collection_stats':
+        params = {'offset': rng.choice((0, 0, 50, 200)), 'limit': 50}
+        return await client.get(f'/api/collections/{collection_id}/statistics', params=params, headers=user.headers)
+    if operation == 'collection_add':
+        doc_ids = rng.sample(user.doc_ids, min(len(user.doc_ids), rng.randint(1, 5)))
+        members.update(doc_ids)
+        return await client.post(f'/api/collections/{collection_id}/documents', json={'doc_ids': doc_ids}, headers=user.headers)
+    if operation == 'collection_remove':
+        # В коллекции остается не меньше MIN_MEMBERS документов для similar; если удалять нечего,
+        # удаляется документ не из коллекции (запрос без изменений)
+        count = min(len(members) - MIN_MEMBERS, rng.randint(1, 5))
+        if count > 0:
+            doc_ids = rng.sample(sorted(members), count)
+        else:
+            doc_ids = [rng.choice([doc_id for doc_id in user.doc_ids if doc_id not in members] or user.doc_ids)]
+        members.difference_update(doc_ids)
+        return await client.request('DELETE', f'/api/collections/{collection_id}/documents', json={'doc_ids': doc_ids}, headers=user.headers)
+    if operation == 'huffman':
+        return await client.get(f'/api/documents/{rng.choice(user.doc_ids)}/huffman', headers=user.headers)
+    if operation == 'login':
+        return await client.post('/api/auth/login', data={'username': user.username, 'password': PASSWORD})
+    if operation == 'search':
+        query = ' '.join(rng.choice(texts)[1][:200].split()[:3])
+        return await client.get(f'/api/collections/{collection_id}/search', params={'q': query or 'a'}, headers=user.headers)
+    if operation == 'similar':
+        doc_id = rng.choice(sorted(members))
+        return await client.get(f'/api/collections/{collection_id}/documents/{doc_id}/similar', headers=user.headers)
+    return await client.get('/api/info/metrics')
+
+async def replay(
+    client: httpx.AsyncClient,
+    users: list[BenchUser],
+    texts: list[tuple[str, str]],
+    plan: list[str],
+    concurrency: int,
+    seed: int
+    ) -> tuple[dict[str, list[float]], dict[str, int], float]:
+    latencies = {operation: [] for operation in WORKLOAD}
+    errors = dict.fromkeys(WORKLOAD, 0)
+    queue: asyncio.Queue[tuple[int, str]] = asyncio.Queue()
+    for item in enumerate(plan):
+        queue.put_nowait(item)
+
+    async def worker():
+        while not queue.empty():
+            index, operation = queue.get_nowait()
+            rng = random.Random(seed * 1_000_003 + index)
+            user = users[index % len(users)]
+            start = time.perf_counter()
+            try:
+                response = await run_operation(client, operation, user, texts, rng)
+                failed = response.status_code >= 400
+            except (httpx.HTTPError, IndexError, ValueError):
+                failed = True
+            latencies[operation].append(time.perf_counter() - start)
+            errors[operation] += failed
+
+    start = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    return latencies, errors, time.perf_counter() - start
+
+async def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--operations', type=int, default=1000)
+    parser.add_argument('--concurrency', type=int, default=16)
+    parser.add_argument('--users', type=int, default=4)
+    parser.add_argument('--initial-docs', type=int, default=20, help='documents uploaded by each user before the replay')
+    parser.add_argument('--sizes', type=float, nargs='+', default=[1, 16, 256], help='upload sizes, KB (up to 51200 = 50 MB)')
+    parser.add_argument('--variants', type=int, default=3, help='texts per size and alphabet')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--fakeredis', action='store_true', help='use fakeredis instead of REDIS_*')
+    parser.add_argument('--save', help='write results to a JSON file')
+    parser.add_argument('--compare', help='compare with results saved by --save')
+    args = parser.parse_args()
+
+    if args.fakeredis:
+        use_fakeredis()
+    baseline = load_results(args.compare)
+
+    rng = random.Random(args.seed)
+    texts = make_texts(args.sizes, args.variants, args.seed)
+    plan = rng.choices(list(WORKLOAD), weights=list(WORKLOAD.values()), k=args.operations)
+
+    async with app_client() as client:
+        users = [await create_user(client, texts, args.initial_docs, rng) for _ in range(args.users)]
+        latencies, errors, elapsed = await replay(client, users, texts, plan, args.concurrency, args.seed)
+
+    rows = []
+    results = {}
+    for operation, values in latencies.items():
+        if not values:
+            continue
+        p50 = percentile(values, 0.5) * 1000
+        p99 = percentile(values, 0.99) * 1000
+        results[f'{operation} p50 ms'] = p50
+        results[f'{operation} p99 ms'] = p99
+        rows.append((
+            operation, len(values), errors[operation], f'{len(values) / elapsed:.1f}',
+            f'{p50:.1f}', f'{p99:.1f}', change(p99, baseline.get(f'{operation} p99 ms'))
+        ))
+    results['total ops/s'] = len(plan) / elapsed
+    rows.append(('total', len(plan), sum(errors.values()), f'{len(plan) / elapsed:.1f}', '', '', ''))
+    report(rows, ('operation', 'ops', 'errors', 'ops/s', 'p50 ms', 'p99 ms', 'p99 vs saved'))
+
+    if args.save:
+        save_results(args.save, results)
+
+if __name__ == '__main__':
+    asyncio.run(main())
@@ -0,0 +1,49 @@
+'''Сравнение однопроходного count_words с прежней схемой
+get_text_length + split_text + Counter на латинице и кириллице.
+
+    python benchmarks/bench_tokenizer.py --sizes 1 8 32
+'''
+import argparse
+import time
+import tracemalloc
+from collections import Counter
+
+from corpus import corpora, report
+from logic.text_utils import count_words, get_text_length, split_text
+
+def legacy_count_words(text: str) -> tuple[int, Counter[str]]:
+    return get_text_length(text), Counter(split_text(text))
+
+def measure(func, text: str) -> tuple[float, float, tuple]:
+    start = time.perf_counter()
+    result = func(text)
+    elapsed = time.perf_counter() - start
+
+    tracemalloc.start()
+    func(text)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return elapsed, peak / 1024 / 1024, result
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--sizes', type=float, nargs='+', default=[1, 8, 32], help='corpus sizes, MB')
+    args = parser.parse_args()
+
+    rows = []
+    for name, text in corpora(args.sizes):
+        size_mb = len(text.encode('utf-8')) / 1024 / 1024
+        legacy_time, legacy_peak, legacy = measure(legacy_count_words, text)
+        single_time, single_peak, single = measure(count_words, text)
+        assert legacy == single
+        rows.append((
+            name,
+            f'{size_mb / legacy_time:.1f}',
+            f'{size_mb / single_time:.1f}',
+            f'{legacy_peak:.1f}',
+            f'{single_peak:.1f}',
+        ))
+    report(rows, ('corpus', 'legacy MB/s', 'single-pass MB/s', 'legacy peak MB', 'single-pass peak MB'))
+
+if __name__ == '__main__':
+    main()
\ No newline at end of file
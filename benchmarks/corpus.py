@@ -0,0 +1,48 @@
+import random
+import sys
+from pathlib import Path
+
+APP_DIR = Path(__file__).resolve().parent.parent / 'app'
+if str(APP_DIR) not in sys.path:
+    sys.path.insert(0, str(APP_DIR))
+
+LATIN = 'abcdefghijklmnopqrstuvwxyz'
+CYRILLIC = 'абвгдеёжзийклмнопрстуфхцчшщъыьэюя'
+PUNCTUATION = ['.', ',', '!', '?', ';', ':', ' -']
+
+def make_vocabulary(alphabet: str, size: int, seed: int = 0) -> list[str]:
+    rng = random.Random(seed)
+    return [
+        ''.join(rng.choice(alphabet) for _ in range(rng.randint(1, 12)))
+        for _ in range(size)
+    ]
+
+def make_text(size_bytes: int, alphabet: str = LATIN, vocabulary_size: int = 20000, seed: int = 0) -> str:
+    '''Синтетический текст размером ~size_bytes байт в UTF-8 с распределением слов, близким к закону Ципфа'''
+    rng = random.Random(seed)
+    vocabulary = make_vocabulary(alphabet, vocabulary_size, seed)
+    weights = [1 / rank for rank in range(1, vocabulary_size + 1)]
+    parts = []
+    written = 0
+    while written < size_bytes:
+        words = rng.choices(vocabulary, weights=weights, k=4096)
+        for index in range(0, len(words), rng.randint(8, 20)):
+            words[index] = words[index].capitalize()
+            words[index - 1] += rng.choice(PUNCTUATION)
+        line = ' '.join(words) + '\n'
+        parts.append(line)
+        written += len(line.encode('utf-8'))
+    text = ''.join(parts)
+    return text.encode('utf-8')[:size_bytes].decode('utf-8', errors='ignore')
+
+def corpora(sizes_mb: list[float]) -> list[tuple[str, str]]:
+    return [
+        (f'{name} {size_mb:g} MB', make_text(int(size_mb * 1024 * 1024), alphabet))
+        for size_mb in sizes_mb
+        for name, alphabet in (('latin', LATIN), ('cyrillic', CYRILLIC))
+    ]
+
+def report(rows: list[tuple], header: tuple):
+    widths = [max(len(str(value)) for value in column) for column in zip(header, *rows)]
+    for row in (header, *rows):
+        print('  '.join(str(value).ljust(width) for value, width in zip(row, widths)))
\ No newline at end of file
@@ -0,0 +1,58 @@
+'''Общая часть сквозных бенчмарков: приложение запускается в этом же процессе (httpx.ASGITransport),
+PostgreSQL берется из .env (POSTGRES_*), Redis - из .env (REDIS_*) или заменяется на fakeredis.
+Результаты можно сохранить в JSON и сравнить следующий прогон с сохраненным'''
+import json
+import math
+from contextlib import asynccontextmanager
+from pathlib import Path
+
+import httpx
+
+import corpus  # noqa: F401 - добавляет app в sys.path
+
+def use_fakeredis():
+    '''Подмена клиента Redis. Вызывается до импорта остальных модулей приложения:
+    они берут redis_client из auth.blacklist при импорте'''
+    try:
+        import fakeredis
+    except ImportError:
+        raise SystemExit('fakeredis is not installed: pip install fakeredis')
+    import auth.blacklist
+    auth.blacklist.redis_client = fakeredis.FakeAsyncRedis()
+
+@asynccontextmanager
+async def app_client():
+    '''Таблицы и агрегаты метрик создаются как в migrate.py, затем запускается lifespan приложения'''
+    from infra.database import engine, init_db, session_local
+    from logic.metrics import init_metrics
+    from main import app
+
+    await init_db()
+    async with session_local() as db:
+        await init_metrics(db)
+    async with app.router.lifespan_context(app):
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url='http://bench', timeout=600) as client:
+            yield client
+    await engine.dispose()
+
+def percentile(values: list[float], q: float) -> float:
+    '''Квантиль по ближайшему рангу'''
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[max(math.ceil(q * len(ordered)) - 1, 0)]
+
+def save_results(path: str, results: dict[str, float]):
+    Path(path).write_text(json.dumps(results, indent=2, ensure_ascii=False), encoding='utf-8')
+
+def load_results(path: str | None) -> dict[str, float]:
+    if not path:
+        return {}
+    return json.loads(Path(path).read_text(encoding='utf-8'))
+
+def change(value: float, baseline: float | None) -> str:
+    '''Изменение относительно сохраненного прогона: +N% - медленнее, -N% - быстрее'''
+    if not baseline:
+        return '-'
+    return f'{(value - baseline) / baseline * 100:+.1f}%'
@@ -0,0 +1,37 @@
+import random
+import string
+
+import pytest
+
+from infra.bloom import BloomFilter
+
+def random_tokens(rng: random.Random, count: int) -> list[str]:
+    return [''.join(rng.choices(string.ascii_letters + string.digits, k=22)) for _ in range(count)]
+
+@pytest.mark.parametrize('capacity, error_rate', [(1, 0.01), (100, 0.1), (2000, 0.01), (5000, 0.001)])
+def test_no_false_negatives(capacity, error_rate):
+    rng = random.Random(capacity)
+    bloom = BloomFilter(capacity, error_rate)
+    # Переполнение увеличивает долю ложных "да", но не дает ложных "нет"
+    tokens = random_tokens(rng, capacity * 3)
+    for token in tokens:
+        bloom.add(token)
+    assert all(token in bloom for token in tokens)
+    assert bloom.count == len(tokens)
+
+@pytest.mark.parametrize('capacity, error_rate', [(1000, 0.1), (2000, 0.01), (5000, 0.001)])
+def test_false_positive_rate_near_error_rate(capacity, error_rate):
+    rng = random.Random(capacity)
+    bloom = BloomFilter(capacity, error_rate)
+    members = random_tokens(rng, capacity)
+    for token in members:
+        bloom.add(token)
+    member_set = set(members)
+    others = [token for token in random_tokens(rng, 50_000) if token not in member_set]
+    rate = sum(token in bloom for token in others) / len(others)
+    assert rate <= 1.5 * error_rate
+
+def test_empty_filter_contains_nothing():
+    bloom = BloomFilter(0, 0.01)
+    assert bloom.size >= 8 and bloom.hash_count >= 1
+    assert not any(token in bloom for token in random_tokens(random.Random(0), 1000))
@@ -0,0 +1,109 @@
+import random
+from collections import Counter
+
+import pytest
+
+from logic.huffman import (
+    DECODE_TABLE_BITS, HuffmanEncoder, decode, encode, get_canonical_codes, get_code_lengths, iter_bits,
+)
+
+def fibonacci_text(symbols: int) -> str:
+    '''Частоты по Фибоначчи дают самое глубокое дерево: длина кода растет на 1 с каждым символом'''
+    counts = [1, 1]
+    while len(counts) < symbols:
+        counts.append(counts[-1] + counts[-2])
+    chars = [chr(0x400 + index) for index in range(symbols)]
+    text = list(''.join(char * count for char, count in zip(chars, counts)))
+    random.Random(symbols).shuffle(text)
+    return ''.join(text)
+
+def random_text(rng: random.Random, alphabet: str, size: int) -> str:
+    weights = [rng.random() ** 3 for _ in alphabet]
+    return ''.join(rng.choices(alphabet, weights, k=size))
+
+TEXTS = [
+    'abracadabra',
+    'Привет, мир! Hello, world!\n' * 20,
+    fibonacci_text(20),
+    *(random_text(random.Random(seed), alphabet, 3000) for seed, alphabet in enumerate([
+        'ab', 'abcdefgh \n', 'абвгдеёжзийклмнопрстуфхцчшщъыьэюя .,\n', ''.join(map(chr, range(32, 400))),
+    ])),
+]
+
+def code_bits(code_lengths: dict[str, int]) -> dict[str, str]:
+    return {char: format(code, f'0{length}b') for char, (code, length) in get_canonical_codes(code_lengths).items()}
+
+@pytest.mark.parametrize('text', TEXTS)
+def test_code_lengths_are_complete_and_optimal(text):
+    char_count = Counter(text)
+    code_lengths = get_code_lengths(char_count)
+    assert code_lengths.keys() == char_count.keys()
+    assert sum(2 ** -length for length in code_lengths.values()) == 1
+    # Более частый символ никогда не получает более длинный код
+    by_count = sorted(char_count, key=char_count.get)
+    for rarer, frequent in zip(by_count, by_count[1:]):
+        if char_count[rarer] < char_count[frequent]:
+            assert code_lengths[rarer] >= code_lengths[frequent]
+
+@pytest.mark.parametrize('text', TEXTS)
+def test_canonical_codes_are_prefix_free_and_ordered(text):
+    code_lengths = get_code_lengths(Counter(text))
+    codes = get_canonical_codes(code_lengths)
+    assert {char: length for char, (_, length) in codes.items()} == code_lengths
+    ordered = sorted(codes, key=lambda char: (code_lengths[char], char))
+    assert list(codes) == ordered
+    values = [code << (64 - length) for code, length in codes.values()]
+    assert values == sorted(values) and len(set(values)) == len(values)
+    bits = sorted(code_bits(code_lengths).values())
+    for shorter, longer in zip(bits, bits[1:]):
+        assert not longer.startswith(shorter)
+
+@pytest.mark.parametrize('text', TEXTS)
+def test_encode_decode_round_trip(text):
+    code_lengths = get_code_lengths(Counter(text))
+    encoded = encode(text, code_lengths)
+    assert encoded.bit_length == sum(code_lengths[char] for char in text)
+    assert len(encoded.data) == (encoded.bit_length + 7) // 8
+    assert ''.join(decode(encoded.data, encoded.bit_length, encoded.code_lengths)) == text
+
+def test_long_codes_round_trip():
+    text = fibonacci_text(20)
+    code_lengths = get_code_lengths(Counter(text))
+    assert max(code_lengths.values()) > DECODE_TABLE_BITS
+    encoded = encode(text, code_lengths)
+    assert ''.join(decode(encoded.data, encoded.bit_length, code_lengths)) == text
+
+@pytest.mark.parametrize('text', TEXTS)
+def test_iter_bits_matches_code_strings(text):
+    code_lengths = get_code_lengths(Counter(text))
+    encoded = encode(text, code_lengths)
+    expected = ''.join(map(code_bits(code_lengths).__getitem__, text))
+    for chunk_size in (1, 3, 1 << 16):
+        assert ''.join(iter_bits(encoded.data, encoded.bit_length, chunk_size)) == expected
+
+def test_encoder_feed_in_parts_matches_encode():
+    rng = random.Random(1)
+    text = random_text(rng, 'абвгд abcde\n', 200_000)
+    code_lengths = get_code_lengths(Counter(text))
+    encoder = HuffmanEncoder(code_lengths)
+    cuts = sorted(rng.sample(range(len(text)), 30))
+    for start, end in zip([0, *cuts], [*cuts, len(text)]):
+        encoder.feed(text[start:end])
+    assert encoder.finish() == encode(text, code_lengths)
+
+def test_single_symbol_text():
+    text = 'я' * 13
+    code_lengths = get_code_lengths(Counter(text))
+    assert code_lengths == {'я': 1}
+    encoded = encode(text, code_lengths)
+    assert encoded.bit_length == 13
+    assert ''.join(iter_bits(encoded.data, encoded.bit_length)) == '0' * 13
+    assert ''.join(decode(encoded.data, encoded.bit_length, code_lengths)) == text
+
+def test_empty_text():
+    code_lengths = get_code_lengths(Counter(''))
+    assert code_lengths == {}
+    encoded = encode('', code_lengths)
+    assert (encoded.data, encoded.bit_length) == (b'', 0)
+    assert list(decode(encoded.data, encoded.bit_length, code_lengths)) == []
+    assert ''.join(iter_bits(encoded.data, encoded.bit_length)) == ''
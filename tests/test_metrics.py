@@ -0,0 +1,80 @@
+import random
+
+import pytest
+
+from core.metrics import QuantileSketch
+
+QUANTILES = [0, 0.01, 0.1, 0.25, 0.5, 0.75, 0.9, 0.95, 0.99, 1]
+
+def exact_quantile(values: list[float], q: float) -> float:
+    '''Тот же ранг, что и в QuantileSketch.quantile'''
+    ordered = sorted(values)
+    return ordered[int(q * (len(ordered) - 1))]
+
+def assert_relative_error(sketch: QuantileSketch, values: list[float]):
+    for q in QUANTILES:
+        expected = exact_quantile(values, q)
+        estimate = sketch.quantile(q)
+        if expected < sketch.min_value:
+            assert estimate == 0.0
+        else:
+            assert abs(estimate - expected) <= sketch.alpha * expected * (1 + 1e-9), q
+
+def samples(rng: random.Random, distribution: str, count: int) -> list[float]:
+    if distribution == 'lognormal':
+        return [rng.lognormvariate(0, 2) for _ in range(count)]
+    if distribution == 'uniform':
+        return [rng.uniform(0.001, 10) for _ in range(count)]
+    if distribution == 'pareto':
+        return [rng.paretovariate(1.2) for _ in range(count)]
+    # Время обработки: в основном миллисекунды, часть значений ниже min_value
+    return [rng.choice([rng.expovariate(100), rng.expovariate(1), 1e-9]) for _ in range(count)]
+
+@pytest.mark.parametrize('alpha', [0.01, 0.05])
+@pytest.mark.parametrize('distribution', ['lognormal', 'uniform', 'pareto', 'mixed'])
+def test_quantiles_within_relative_error(alpha, distribution):
+    rng = random.Random(f'{distribution}-{alpha}')
+    values = samples(rng, distribution, 5000)
+    sketch = QuantileSketch(alpha=alpha, min_value=1e-6)
+    for value in values:
+        sketch.add(value)
+    assert sketch.count == len(values)
+    assert_relative_error(sketch, values)
+
+def test_bucket_count_grows_with_range_not_count():
+    sketch = QuantileSketch(alpha=0.01)
+    rng = random.Random(0)
+    for _ in range(50_000):
+        sketch.add(rng.uniform(1, 100))
+    # log(100) / log(gamma) ~ 231 корзина
+    assert len(sketch.buckets) <= 235
+
+def test_merged_buckets_match_single_sketch():
+    rng = random.Random(1)
+    parts = [samples(rng, 'lognormal', 1000) for _ in range(4)]
+    merged = QuantileSketch()
+    for part in parts:
+        sketch = merged.empty()
+        for value in part:
+            sketch.add(value)
+        for key, count in sketch.buckets.items():
+            merged.add_bucket(key, count)
+    values = [value for part in parts for value in part]
+    assert merged.count == len(values)
+    assert_relative_error(merged, values)
+
+def test_removed_values_leave_remaining_quantiles():
+    '''Удаление документа вычитает его корзину, как record_docs с sign=-1'''
+    rng = random.Random(2)
+    values = samples(rng, 'mixed', 3000)
+    sketch = QuantileSketch(min_value=0.001)
+    for value in values:
+        sketch.add(value)
+    removed, kept = values[:1000], values[1000:]
+    for value in removed:
+        sketch.add_bucket(sketch.key(value), -1)
+    assert sketch.count == len(kept)
+    assert_relative_error(sketch, kept)
+
+def test_empty_sketch():
+    assert QuantileSketch().quantile(0.5) == 0.0
@@ -0,0 +1,77 @@
+import asyncio
+import io
+import random
+from collections import Counter
+
+import pytest
+
+from logic.text_utils import WordCounter, count_words
+
+TEXTS = [
+    'hello\nworld',
+    'hello\n\nworld\n',
+    'Привет, мир!\nПРИВЕТ мир_2024 x',
+    'a' * 5000 + ' b\n' + 'c' * 3000,
+    ' \n leading and trailing \n ',
+    'ΟΔΟΣ σοφίας. Ёлка, ёлка;word123\tend',
+    '',
+]
+
+def split_randomly(text: str, rng: random.Random) -> list[str]:
+    cuts = sorted(rng.sample(range(len(text) + 1), min(len(text) + 1, rng.randint(1, 12))))
+    return [text[start:end] for start, end in zip([0, *cuts], [*cuts, len(text)])]
+
+@pytest.mark.parametrize('text', TEXTS)
+def test_word_counter_matches_count_words_on_random_splits(text):
+    rng = random.Random(text)
+    expected = count_words(text)
+    for _ in range(200):
+        counter = WordCounter()
+        for chunk in split_randomly(text, rng):
+            counter.feed(chunk)
+        assert counter.close() == expected
+
+def test_word_counter_chunk_ends_with_newline():
+    counter = WordCounter()
+    counter.feed('hello\n')
+    counter.feed('world')
+    assert counter.close() == count_words('hello\nworld')
+
+def test_word_counter_long_word_across_chunks():
+    counter = WordCounter()
+    for _ in range(100):
+        counter.feed('a' * 1000)
+    counter.feed(' b')
+    length, word_counts = counter.close()
+    assert length == 2
+    assert word_counts == {'a' * 100_000: 1, 'b': 1}
+
+def test_streaming_analyzer_splits_utf8_and_words():
+    from logic.analysis import StreamingAnalyzer
+
+    text = 'Привет,\nмир! hello\nworld ' * 50
+    data = text.encode('utf-8')
+    rng = random.Random(0)
+    for _ in range(50):
+        analyzer = StreamingAnalyzer()
+        cuts = sorted(rng.sample(range(1, len(data)), 20))
+        for start, end in zip([0, *cuts], [*cuts, len(data)]):
+            analyzer.feed(data[start:end])
+        assert analyzer.finish() == count_words(text)
+        assert analyzer.char_counts == Counter(text)
+
+@pytest.mark.parametrize('threshold', [1 << 30, 1000])
+def test_analyze_upload_matches_analyze_text(monkeypatch, threshold):
+    from fastapi import UploadFile
+
+    import logic.analysis
+    from logic.analysis import analyze_text, analyze_upload
+
+    monkeypatch.setattr(logic.analysis, 'ANALYSIS_INLINE_THRESHOLD', threshold)
+    monkeypatch.setattr(logic.analysis, 'UPLOAD_CHUNK_SIZE', 333)
+    text = 'Привет,\r\nмир! hello\nworld ' * 200
+    upload = UploadFile(io.BytesIO(text.encode('utf-8')), filename='text.txt')
+    uploaded, analysis = asyncio.run(analyze_upload(upload))
+    expected = analyze_text(text)
+    assert uploaded == text
+    assert (analysis.length, analysis.word_counts, analysis.huffman) == (expected.length, expected.word_counts, expected.huffman)